@@ -6,6 +6,11 @@ from PyInstaller import __main__ as pyi
 import i2cpy
 i2cpy_path = os.path.dirname(i2cpy.__file__)
 
+# 预先生成静态文件的gzip/brotli压缩版本
+sys.path.insert(0, 'src')
+from assets import precompress
+precompress('static')
+
 # 确保输出目录存在
 dist_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dist'))
 os.makedirs(dist_dir, exist_ok=True)
@@ -25,6 +30,8 @@ params = [
     '--noconfirm',
     # 添加必要的隐藏导入
     # '--hidden-import', 'i2cpy',
+    # app.py以导入字符串加载web模块
+    '--hidden-import', 'web',
     # 主程序
     'src/app.py'
 ]
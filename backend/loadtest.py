@@ -0,0 +1,339 @@
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# 端到端负载测试：在子进程中启动基于模拟EEPROM的web服务，按场景并发请求，
+# 输出各接口的吞吐量和p50/p95/p99延迟，以及总线不可用等错误
+# 用法: python loadtest.py --scenario mixed --users 8 --duration 10
+#      python loadtest.py --workers 4 --write-behind-ms 200    对比多进程和写回模式
+#      python loadtest.py --url http://127.0.0.1:8000          测试已启动的服务
+# 测试已启动的服务时默认不格式化，需要测试文件时加--seed，会清空目标设备
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+sys.path.insert(0, SRC)
+
+SEED_FILES = 10
+
+
+class Stats:
+    """按接口汇总的请求延迟和错误"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def record(self, route: str, elapsed: float, status):
+        with self._lock:
+            if status == 200:
+                self.latencies[route].append(elapsed)
+            else:
+                self.errors[route][status] += 1
+
+    def report(self, duration: float) -> dict:
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[route])
+            routes[route] = {
+                "requests": len(values) + sum(self.errors[route].values()),
+                "errors": dict(self.errors[route]),
+                "rps": round((len(values) + sum(self.errors[route].values())) / duration, 1),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": round(values[-1] * 1000, 2) if values else None,
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {"duration": round(duration, 2), "requests": total, "rps": round(total / duration, 1), "routes": routes}
+
+
+def percentile(values: list, p: float):
+    """最近秩法百分位数(毫秒)，values需已排序"""
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1)] * 1000, 2)
+
+
+class User:
+    """一个并发用户，持有独立的连接，并行请求(如前端刷新)使用额外的连接"""
+
+    def __init__(self, host: str, port: int, stats: Stats, index: int = 0, parallel: int = 3):
+        self.host = host
+        self.index = index
+        self.port = port
+        self.stats = stats
+        self.pool = ThreadPoolExecutor(parallel)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method: str, path: str, route: str, body=None):
+        """发送请求并记录延迟，连接失败记为conn错误"""
+        headers = {}
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            status = "conn"
+        self.stats.record(route, time.perf_counter() - start, status)
+        return status
+
+    def parallel(self, requests: list):
+        """并行发送一组请求，全部完成后返回"""
+        list(self.pool.map(lambda args: self.request(*args), requests))
+
+    def close(self):
+        self.pool.shutdown()
+
+
+# 场景：每次调用执行一轮操作
+
+def refresh(user: User):
+    """前端刷新：并行获取状态、存储信息和文件列表"""
+    user.parallel([
+        ("GET", "/eeprom/status", "GET /status"),
+        ("GET", "/eeprom/storage", "GET /storage"),
+        ("GET", "/eeprom/list", "GET /list"),
+    ])
+
+
+def edit(user: User, saves: int = 5):
+    """编辑器保存：打开文件后连续保存，每次保存后前端刷新"""
+    filename = f"seed{random.randrange(SEED_FILES)}.txt"
+    user.request("GET", f"/eeprom/read/{filename}", "GET /read/{file}")
+    content = "编辑内容\n" * random.randint(10, 100)
+    for i in range(saves):
+        content += f"第{i}次保存\n"
+        user.request("POST", f"/eeprom/write/{filename}", "POST /write/{file}", {"content": content})
+        refresh(user)
+
+
+def search(user: User):
+    """全文搜索"""
+    user.request("POST", "/eeprom/search", "POST /search", {"keyword": "保存"})
+
+
+def log(user: User):
+    """日志追加"""
+    user.request("POST", "/eeprom/append/app.log", "POST /append/{file}",
+                 {"content": f"{time.time():.3f} 日志行\n"})
+
+
+def search_while_writing(user: User):
+    """一半用户搜索，一半用户写入"""
+    if user.index % 2:
+        search(user)
+    else:
+        random.choice([edit, log])(user)
+
+
+def mixed(user: User):
+    random.choices([refresh, edit, search, log], weights=[5, 2, 1, 2])[0](user)
+
+
+SCENARIOS = {
+    "refresh": refresh,
+    "edit": edit,
+    "search": search_while_writing,
+    "log": log,
+    "mixed": mixed,
+}
+
+
+def seed(host: str, port: int):
+    """格式化并写入测试文件"""
+    user = User(host, port, Stats())
+    user.request("POST", "/eeprom/format", "seed")
+    for i in range(SEED_FILES):
+        user.request("POST", f"/eeprom/write/seed{i}.txt", "seed", {"content": "初始内容\n" * (i * 20 + 1)})
+    user.close()
+
+
+def run_load(host: str, port: int, scenario: str, users: int, duration: float, think: float) -> dict:
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+
+    def loop(index: int):
+        user = User(host, port, stats, index)
+        try:
+            while time.perf_counter() < deadline:
+                SCENARIOS[scenario](user)
+                if think:
+                    time.sleep(random.uniform(0, 2 * think))
+        finally:
+            user.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.perf_counter() - start)
+
+
+def wait_ready(host: str, port: int, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("服务进程已退出")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/eeprom/status")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("等待服务启动超时")
+
+
+def start_server(args, log_file):
+    """
+    在子进程中启动模拟EEPROM服务，负载生成与服务不共用GIL
+    监听socket在本进程中绑定后交给子进程(uvicorn的fd参数)，端口从分配到使用不会被其他进程占用；
+    Windows不能按文件描述符继承socket，只能传端口号
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    port = sock.getsockname()[1]
+    env = dict(os.environ)
+    if args.write_behind_ms:
+        env["EEPROM_WRITE_BEHIND_MS"] = str(args.write_behind_ms)
+    command = [sys.executable, os.path.abspath(__file__), "--serve",
+               "--workers", str(args.workers), "--bus-khz", str(args.bus_khz), "--nack-rate", str(args.nack_rate)]
+    with sock:
+        if sys.platform == "win32":
+            sock.close()
+            command += ["--port", str(port)]
+            # 需要独立的进程组才能发送CTRL_BREAK_EVENT
+            process = subprocess.Popen(command, cwd=SRC, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+                                       creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+        else:
+            command += ["--fd", str(sock.fileno())]
+            process = subprocess.Popen(command, cwd=SRC, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+                                       pass_fds=[sock.fileno()])
+    return process, port
+
+
+def stop_server(process: subprocess.Popen):
+    if process.poll() is None:
+        process.send_signal(signal.CTRL_BREAK_EVENT if sys.platform == "win32" else signal.SIGINT)
+        try:
+            process.wait(15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def serve(args):
+    """服务进程：使用模拟EEPROM运行web.py"""
+    import web
+    from driver.trace import SimulatedEEPROM
+    device = SimulatedEEPROM(bus_khz=args.bus_khz or None, nack_rate=args.nack_rate)
+    if args.fd is not None:
+        web.run(args.workers, device, fd=args.fd, log_level="warning")
+    else:
+        web.run(args.workers, device, port=args.port, log_level="warning")
+
+
+def print_report(result: dict, args):
+    print(f"\n=== 负载测试 场景={args.scenario} 用户={args.users} 工作进程={args.workers} "
+          f"写回={args.write_behind_ms or 0}ms 总线={args.bus_khz or '不限'}kHz ===")
+    print(f"{'接口':<22}{'请求数':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  错误")
+    fmt = lambda v: f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+    for route, item in result["routes"].items():
+        errors = " ".join(f"{status}:{count}" for status, count in item["errors"].items())
+        print(f"{route:<22}{item['requests']:>8}{item['rps']:>9.1f}{fmt(item['p50_ms'])}{fmt(item['p95_ms'])}"
+              f"{fmt(item['p99_ms'])}{fmt(item['max_ms'])}  {errors}")
+    print(f"{'总计':<22}{result['requests']:>8}{result['rps']:>9.1f}   (延迟单位ms，时长{result['duration']}s)")
+
+    errors = Counter()
+    for item in result["routes"].values():
+        errors.update(item["errors"])
+    if errors.get(503):
+        print(f"警告: {errors[503]} 个请求返回503，总线断路器断开或总线代理不可用")
+    other = sum(count for status, count in errors.items() if status != 503)
+    if other:
+        print(f"警告: {other} 个请求失败 {dict(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EEPROM接口端到端负载测试")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--users", type=int, default=8, help="并发用户数")
+    parser.add_argument("--duration", type=float, default=10, help="测试时长(秒)")
+    parser.add_argument("--think-ms", type=float, default=0, help="每轮操作之间的平均间隔")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn工作进程数，大于1时使用总线代理")
+    parser.add_argument("--write-behind-ms", type=float, default=0, help="启用写回模式的提交延迟")
+    parser.add_argument("--bus-khz", type=float, default=400, help="模拟的I2C时钟，0表示不模拟传输时间")
+    parser.add_argument("--nack-rate", type=float, default=0.0, help="模拟的随机无应答概率")
+    parser.add_argument("--url", help="测试已启动的服务，不启动模拟服务")
+    parser.add_argument("--seed", action=argparse.BooleanOptionalAction,
+                        help="格式化并写入测试文件，默认只对本工具启动的模拟服务执行，--url时需显式指定")
+    parser.add_argument("--json", help="把结果写入JSON文件")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8000, help=argparse.SUPPRESS)
+    parser.add_argument("--fd", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    process = None
+    log_path = os.path.join(tempfile.gettempdir(), "eeprom-loadtest-server.log")
+    with open(log_path, "wb") as log_file:
+        if args.url:
+            from urllib.parse import urlsplit
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            process, port = start_server(args, log_file)
+            host = "127.0.0.1"
+        try:
+            if process is not None:
+                wait_ready(host, port, process)
+            # 格式化会清空设备，测试已启动的服务时只在显式指定--seed时执行
+            if args.seed or (args.seed is None and process is not None):
+                seed(host, port)
+            result = run_load(host, port, args.scenario, args.users, args.duration, args.think_ms / 1000)
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    print_report(result, args)
+    if process is not None:
+        print(f"服务日志: {log_path}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import urllib.request
+
+# 启动耗时分析：不打开窗口，按阶段测量app.py的启动路径
+# 用法: python profile_startup.py
+# 查看各模块导入耗时: python -X importtime profile_startup.py
+
+t0 = time.perf_counter()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+timings = []
+
+def mark(name, start):
+    now = time.perf_counter()
+    timings.append((name, (now - start) * 1000))
+    return now
+
+import app
+t = mark('导入app', t0)
+
+sock = app.bind_socket()
+host, port = sock.getsockname()
+t = mark('绑定端口', t)
+
+server, thread = app.start_server(sock)
+import webview
+t = mark('导入webview(与服务启动并行)', t)
+
+app.wait_ready(server, thread)
+t = mark('等待服务就绪', t)
+ready = t
+
+def get(path):
+    try:
+        with urllib.request.urlopen(f'http://{host}:{port}{path}') as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+status = get('/')
+t = mark(f'首页首次响应({status})', t)
+
+status = get('/eeprom/status')
+t = mark(f'状态接口首次响应({status})', t)
+
+print('\n=== 启动耗时 ===')
+for name, ms in timings:
+    print(f'{name:<32}{ms:>10.1f} ms')
+print(f'{"窗口可打开(就绪)":<32}{(ready - t0) * 1000:>10.1f} ms')
+print(f'{"总计":<32}{(t - t0) * 1000:>10.1f} ms')
+
+server.should_exit = True
+thread.join(timeout=5)
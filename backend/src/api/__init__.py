@@ -1,4 +1,4 @@
 from .eeprom import router as eeprom_router
+from .session import session as fs_session
 
-__all__ = ["eeprom_router"]
-
+__all__ = ["eeprom_router", "fs_session"]
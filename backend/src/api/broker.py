@@ -0,0 +1,413 @@
+import itertools
+import os
+import pickle
+import secrets
+import signal
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import namedtuple
+from multiprocessing import Process, shared_memory
+from multiprocessing.connection import Client, Listener
+from timing import phase
+from .session import FilesystemSession, DeviceUnavailableError
+
+# 总线代理
+# I2C设备只能由一个进程打开，代理进程持有文件系统并通过本地IPC(Unix socket/Windows命名管道)
+# 提供调用，多个uvicorn工作进程共用同一条总线，总线访问仍由代理进程串行化
+#
+# 请求: ("call", 目标, 方法名, args, kwargs) 目标为"fs"或"session"
+#       ("getattr", 属性名)
+#       ("next", 生成器id) 取生成器的下一段结果
+#       ("close", 生成器id) 提前结束时关闭生成器
+#       ("shutdown",)
+# 响应: ("ok", 结果) 或 ("error", 异常)
+# 超过BULK_THRESHOLD的bytes通过共享内存传递，消息中只带SharedPayload
+# 返回生成器的调用在代理进程中保留生成器，每次只传回ITER_CHUNK项(RemoteIterator)，分页遍历不必取完整个目录树
+
+BULK_THRESHOLD = 16 * 1024
+ITER_CHUNK = 64
+
+SharedPayload = namedtuple("SharedPayload", "name size")
+RemoteIterator = namedtuple("RemoteIterator", "id items done")
+
+
+def default_address() -> str:
+    """默认的IPC地址，Windows使用命名管道，其余平台使用Unix socket"""
+    if sys.platform == "win32":
+        return r"\\.\pipe\eeprom-broker-%d" % os.getpid()
+    return os.path.join(tempfile.gettempdir(), f"eeprom-broker-{os.getpid()}.sock")
+
+
+def _attach(name: str):
+    """
+    打开已有的共享内存，由创建方负责释放
+    Python 3.13以下没有track参数，代理与工作进程由同一父进程启动，共用resource_tracker，重复登记没有影响
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _pack(value, handles: list):
+    """把大块bytes放入共享内存，创建的共享内存加入handles，由调用方在对方读取后释放"""
+    if isinstance(value, (bytes, bytearray, memoryview)) and len(value) >= BULK_THRESHOLD:
+        shm = shared_memory.SharedMemory(create=True, size=len(value))
+        shm.buf[:len(value)] = value
+        handles.append(shm)
+        return SharedPayload(shm.name, len(value))
+    if isinstance(value, memoryview):
+        return bytes(value)  # memoryview无法序列化
+    if isinstance(value, (list, tuple)) and not isinstance(value, SharedPayload):
+        return _rebuild(value, [_pack(item, handles) for item in value])
+    if isinstance(value, dict):
+        return {key: _pack(item, handles) for key, item in value.items()}
+    return value
+
+
+def _unpack(value):
+    """从共享内存中取回数据"""
+    if isinstance(value, SharedPayload):
+        shm = _attach(value.name)
+        try:
+            return bytes(shm.buf[:value.size])
+        finally:
+            shm.close()
+    if isinstance(value, (list, tuple)):
+        return _rebuild(value, [_unpack(item) for item in value])
+    if isinstance(value, dict):
+        return {key: _unpack(item) for key, item in value.items()}
+    return value
+
+
+def _rebuild(value, items: list):
+    """按原类型重建序列，namedtuple(如LFSStat)按字段传参"""
+    if hasattr(value, "_fields"):
+        return type(value)(*items)
+    return type(value)(items)
+
+
+def _release(handles: list):
+    for shm in handles:
+        shm.close()
+        shm.unlink()
+    handles.clear()
+
+
+def _portable_error(e: Exception):
+    """转换为可以跨进程传递的异常，LittleFSError无法直接反序列化，只传错误码"""
+    from littlefs import LittleFSError
+    if isinstance(e, LittleFSError):
+        return ("littlefs", e.code)
+    try:
+        pickle.loads(pickle.dumps(e))
+        return ("pickle", e)
+    except Exception:
+        return ("message", f"{type(e).__name__}: {e}")
+
+
+def _restore_error(error) -> Exception:
+    kind, payload = error
+    if kind == "littlefs":
+        from littlefs import LittleFSError
+        return LittleFSError(payload)
+    if kind == "pickle":
+        return payload
+    return RuntimeError(payload)
+
+
+class BrokerServer:
+    """
+    总线代理服务
+    每个连接一个线程，所有调用通过同一个文件系统会话执行
+    """
+
+    def __init__(self, address: str, authkey: bytes, session: FilesystemSession = None):
+        """
+        :param address: 监听地址，Unix socket路径或Windows命名管道名
+        :param authkey: 连接认证密钥
+        :param session: 文件系统会话，默认新建本地会话
+        """
+        self.address = address
+        self.session = session or FilesystemSession()
+        if sys.platform != "win32" and os.path.exists(address):
+            os.unlink(address)  # 上次异常退出残留的socket文件
+        self._listener = Listener(address, authkey=authkey)
+        self._stop = threading.Event()
+        # 未取完的生成器，工作进程的流式响应可能在不同线程(连接)上继续取
+        self._iterators = {}  # id -> 生成器
+        self._iterator_ids = itertools.count(1)
+        self._iterators_lock = threading.Lock()
+
+    def serve_forever(self):
+        """处理请求直到收到shutdown请求，退出前提交暂存的写入"""
+        thread = threading.Thread(target=self._accept, name="broker-accept", daemon=True)
+        thread.start()
+        try:
+            self._stop.wait()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        self._stop.set()
+
+    def close(self):
+        """提交暂存的写入并停止监听"""
+        try:
+            self.session.close()
+        except Exception as e:
+            print(f"提交暂存的写入失败: {str(e)}")
+        self._listener.close()
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                print(f"总线代理接受连接失败: {str(e)}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), name="broker-conn", daemon=True).start()
+
+    def _handle(self, conn):
+        handles = []  # 上一个响应使用的共享内存，客户端发来下一个请求时已读取完毕
+        owned = set()  # 该连接创建的生成器，连接断开时关闭
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                _release(handles)
+                if request[0] == "shutdown":
+                    # 先提交暂存的写入再应答，调用方返回时数据已写入设备
+                    self.close()
+                    conn.send(("ok", None))
+                    self.shutdown()
+                    return
+                try:
+                    response = ("ok", _pack(self._dispatch(request, owned), handles))
+                except Exception as e:
+                    _release(handles)
+                    response = ("error", _portable_error(e))
+                conn.send(response)
+        finally:
+            _release(handles)
+            conn.close()
+            for iterator_id in owned:
+                self._close_iterator(iterator_id)
+
+    def _dispatch(self, request, owned: set):
+        if request[0] == "getattr":
+            with self.session.use(check_bus=False) as fs:
+                return getattr(fs, request[1])
+        if request[0] == "next":
+            with self._iterators_lock:
+                generator = self._iterators.get(request[1])
+            if generator is None:
+                raise ValueError(f"生成器 {request[1]} 不存在或已结束")
+            with self.session.use(check_bus=False):
+                return self._next_chunk(request[1], generator)
+        if request[0] == "close":
+            self._close_iterator(request[1])
+            return None
+
+        _, target, method, args, kwargs = request
+        args, kwargs = _unpack(args), _unpack(kwargs)
+        if target == "session":
+            # 会话方法(打开/关闭离线镜像等)返回的文件系统对象不传回，客户端继续使用代理
+            result = getattr(self.session, method)(*args, **kwargs)
+            return result if isinstance(result, (dict, list, str, int, float, bool)) else None
+        with self.session.use(check_bus=False) as fs:
+            result = getattr(fs, method)(*args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                iterator_id = next(self._iterator_ids)
+                with self._iterators_lock:
+                    self._iterators[iterator_id] = result
+                owned.add(iterator_id)
+                return self._next_chunk(iterator_id, result)
+            return result
+
+    def _next_chunk(self, iterator_id: int, generator) -> RemoteIterator:
+        """
+        取生成器的下一段，调用方持有会话锁；取完或出错时移除生成器
+        分段的bytes合并为一块，较大时通过共享内存传回
+        """
+        try:
+            items = list(itertools.islice(generator, ITER_CHUNK))
+        except Exception:
+            self._close_iterator(iterator_id)
+            raise
+        done = len(items) < ITER_CHUNK
+        if done:
+            self._close_iterator(iterator_id)
+        if len(items) > 1 and all(isinstance(item, (bytes, bytearray, memoryview)) for item in items):
+            items = [b"".join(items)]
+        return RemoteIterator(iterator_id, items, done)
+
+    def _close_iterator(self, iterator_id: int):
+        with self._iterators_lock:
+            generator = self._iterators.pop(iterator_id, None)
+        if generator is not None:
+            # 生成器结束时可能访问文件系统(如关闭目录)，同样在会话锁内执行
+            with self.session.use(check_bus=False):
+                generator.close()
+
+
+class RemoteFilesystem:
+    """
+    代理进程中文件系统的客户端，接口与I2CEEPROMFileSystem一致
+    每个线程使用独立的连接，单次调用在代理进程中串行执行，多次调用之间不保证原子性
+    """
+
+    # 按属性读取而不是方法调用的成员
+    _ATTRIBUTES = {"i2c_connected", "is_mounted", "bus_available", "size"}
+
+    def __init__(self, address: str, authkey: bytes):
+        self._address = address
+        self._authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self._address, authkey=self._authkey)
+            except OSError as e:
+                raise DeviceUnavailableError(f"无法连接总线代理进程: {str(e)}")
+            self._local.conn = conn
+        return conn
+
+    def _request(self, request):
+        handles = []
+        try:
+            with phase("broker"):
+                conn = self._connection()
+                try:
+                    conn.send(_pack(request, handles))
+                    status, value = conn.recv()
+                except (EOFError, OSError) as e:
+                    self._local.conn = None
+                    conn.close()
+                    raise DeviceUnavailableError(f"总线代理进程连接中断: {str(e)}")
+        finally:
+            _release(handles)
+        if status == "error":
+            raise _restore_error(value)
+        return _unpack(value)
+
+    def call(self, target: str, method: str, *args, **kwargs):
+        """
+        调用代理进程中文件系统(target="fs")或会话(target="session")的方法
+        方法返回生成器时返回本地生成器，迭代时逐段从代理进程取回
+        """
+        result = self._request(("call", target, method, args, kwargs))
+        if isinstance(result, RemoteIterator):
+            return self._iterate(result)
+        return result
+
+    def _iterate(self, iterator: RemoteIterator):
+        """逐段取回代理进程中生成器的结果，提前结束时通知代理进程关闭生成器"""
+        try:
+            while True:
+                yield from iterator.items
+                if iterator.done:
+                    return
+                iterator = self._request(("next", iterator.id))
+        finally:
+            if not iterator.done:
+                try:
+                    self._request(("close", iterator.id))
+                except Exception:
+                    pass  # 代理进程已退出，生成器随连接一起关闭
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._ATTRIBUTES:
+            return self._request(("getattr", name))
+        return lambda *args, **kwargs: self.call("fs", name, *args, **kwargs)
+
+    def close_write_behind(self) -> int:
+        """工作进程退出时只提交暂存的写入，写回模式由代理进程管理"""
+        return self.call("fs", "flush")
+
+    def shutdown(self):
+        """通知代理进程退出"""
+        self._request(("shutdown",))
+
+
+def serve(address: str, authkey: bytes, i2c=None):
+    """
+    在当前进程中运行总线代理
+    :param i2c: 使用指定的I2C实例(如模拟设备)，默认打开CH347
+    """
+    session = FilesystemSession(i2c=i2c)
+    session.start()  # 后台挂载并启动空闲维护
+    server = BrokerServer(address, authkey, session)
+    print(f"总线代理已启动: {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def _serve_child(address: str, authkey: bytes, i2c=None):
+    # Ctrl+C会发给整个进程组，代理进程忽略，由启动进程在工作进程退出后调用stop结束
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    serve(address, authkey, i2c)
+
+
+class BrokerProcess:
+    """在子进程中运行的总线代理"""
+
+    def __init__(self, address: str = None, authkey: bytes = None, i2c=None):
+        """
+        :param i2c: 代理进程使用的I2C实例(如模拟设备)，需要可以序列化，默认打开CH347
+        """
+        self.address = address or default_address()
+        self.authkey = authkey or secrets.token_bytes(16)
+        self.process = Process(target=_serve_child, args=(self.address, self.authkey, i2c),
+                               name="eeprom-broker", daemon=True)
+
+    def start(self, timeout: float = 10):
+        """启动代理进程，等待可以连接后返回"""
+        self.process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                Client(self.address, authkey=self.authkey).close()
+                return self
+            except OSError:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    raise RuntimeError("总线代理进程启动失败")
+                time.sleep(0.05)
+
+    def environ(self) -> dict:
+        """工作进程连接代理所需的环境变量"""
+        return {"EEPROM_BROKER": self.address, "EEPROM_BROKER_AUTHKEY": self.authkey.hex()}
+
+    def stop(self, timeout: float = 10):
+        """通知代理进程提交暂存的写入后退出"""
+        if self.process.is_alive():
+            try:
+                RemoteFilesystem(self.address, self.authkey).shutdown()
+            except Exception as e:
+                print(f"停止总线代理进程失败: {str(e)}")
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+
+
+if __name__ == "__main__":
+    # 单独运行代理: python -m api.broker，工作进程通过环境变量EEPROM_BROKER连接
+    address = os.environ.get("EEPROM_BROKER") or default_address()
+    authkey = bytes.fromhex(os.environ["EEPROM_BROKER_AUTHKEY"]) if "EEPROM_BROKER_AUTHKEY" in os.environ \
+        else secrets.token_bytes(16)
+    if "EEPROM_BROKER_AUTHKEY" not in os.environ:
+        print(f"EEPROM_BROKER={address} EEPROM_BROKER_AUTHKEY={authkey.hex()}")
+    serve(address, authkey)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException
-from driver import I2CEEPROMFileSystem
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Body
+from .session import session, DeviceUnavailableError
+from fastapi.responses import StreamingResponse, Response
+from .timing import JSONResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
+from fnmatch import fnmatchcase
+import json
 import time
 
 router = APIRouter()
 
+# 键值存储的日志文件及压缩时的临时文件(见driver/kvstore.py)，不出现在文件接口中，也不能通过文件接口修改
+RESERVED_PATHS = {".kvstore", ".kvstore.tmp"}
+
 class FileContent(BaseModel):
     content: str
 
@@ -16,74 +22,166 @@ class RenameRequest(BaseModel):
 class BatchDeleteRequest(BaseModel):
     filenames: List[str]
 
+class BatchReadRequest(BaseModel):
+    filenames: List[str] = []
+    pattern: Optional[str] = None
+
 class SearchRequest(BaseModel):
     keyword: str
     case_sensitive: bool = False
 
+class OfflineImageRequest(BaseModel):
+    path: str
+    writable: bool = False
+
+class TraceRequest(BaseModel):
+    path: str
+    snapshot: bool = True
+
+class KVValue(BaseModel):
+    value: str
+
+class KVItems(BaseModel):
+    items: Dict[str, str]
+
+def http_error(e: Exception) -> HTTPException:
+    """把异常转换为HTTP错误，设备不可用时返回503"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, DeviceUnavailableError) or session.device_unavailable():
+        return HTTPException(status_code=503, detail=str(e) or "EEPROM不可用")
+    return HTTPException(status_code=500, detail=str(e))
+
+def is_reserved(path: str) -> bool:
+    """是否为键值存储保留的文件"""
+    return path.strip("/") in RESERVED_PATHS
+
+def check_path(path: str) -> str:
+    """
+    检查URL中的文件路径，在访问文件系统前拒绝空路径、包含"."、".."或空段的路径和保留的文件
+    :param path: 路径
+    :return: 去掉首尾"/"的路径
+    """
+    stripped = path.strip("/")
+    if not stripped:
+        raise HTTPException(status_code=404, detail="路径不能为空")
+    if any(part in ("", ".", "..") for part in stripped.split("/")):
+        raise HTTPException(status_code=400, detail=f"无效的路径 {path}")
+    if is_reserved(stripped):
+        raise HTTPException(status_code=403, detail=f"{stripped} 为键值存储保留的文件，请使用/kv接口")
+    return stripped
+
 @router.get("/status")
 def get_status():
-    """获取EEPROM状态"""
+    """获取EEPROM状态，返回健康监测缓存的状态，首次查询时设备尚未挂载则先挂载"""
     try:
-        fs = I2CEEPROMFileSystem()
-        status = fs.get_status()
         return JSONResponse(content={
             "success": True,
-            "status": status
+            "status": session.status()
         })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @router.post("/reconnect")
 def reconnect():
     """重新连接EEPROM"""
     try:
-        fs = I2CEEPROMFileSystem()
-        success = fs.reconnect()
-        return JSONResponse(content={
-            "success": success,
-            "message": "重新连接成功" if success else "重新连接失败"
-        })
+        with session.use(check_bus=False) as fs:
+            success = fs.reconnect()
+            return JSONResponse(content={
+                "success": success,
+                "message": "重新连接成功" if success else "重新连接失败"
+            })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @router.post("/format")
 def format_eeprom():
     """格式化EEPROM"""
     try:
-        fs = I2CEEPROMFileSystem()
-        fs.format()
-        return JSONResponse(content={
-            "success": True,
-            "message": "格式化成功"
-        })
+        with session.use() as fs:
+            fs.format()
+            return JSONResponse(content={
+                "success": True,
+                "message": "格式化成功"
+            })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @router.get("/list")
-def eeprom_list():
+def eeprom_list(path: str = ""):
     """获取文件列表"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+            if not fs.isdir(path):
+                raise HTTPException(status_code=404, detail=f"目录 {path} 不存在")
             
-        return JSONResponse(content={
-            "success": True,
-            "files": fs.listdir()
-        })
+            return JSONResponse(content={
+                "success": True,
+                "files": [name for name in fs.listdir(path or "/") if not is_reserved(f"{path}/{name}")]
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.get("/walk")
+def eeprom_walk(path: str = "", recursive: bool = True, cursor: Optional[str] = None, limit: int = 100):
+    """分页遍历目录，以NDJSON流式返回条目，最后一行给出下一页的游标"""
+    try:
+        limit = max(1, min(limit, 1000))
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+            if not fs.isdir(path):
+                raise HTTPException(status_code=404, detail=f"目录 {path} 不存在")
+            entries = fs.walk(path, recursive, cursor)
+
+        def lines():
+            count = 0
+            last = None
+            for entry in entries:
+                if is_reserved(entry["path"]):
+                    continue
+                if count == limit:
+                    yield json.dumps({"next_cursor": last}, ensure_ascii=False) + "\n"
+                    return
+                yield json.dumps(entry, ensure_ascii=False) + "\n"
+                last = entry["path"]
+                count += 1
+            yield json.dumps({"next_cursor": None}) + "\n"
+
+        return StreamingResponse(session.locked_iter(lines()), media_type="application/x-ndjson")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
-@router.get("/read/{filename}")
+@router.post("/mkdir/{path:path}")
+def eeprom_mkdir(path: str):
+    """创建目录，父目录不存在时一并创建"""
+    try:
+        path = check_path(path)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            fs.makedirs(path, exist_ok=True)
+            return JSONResponse(content={
+                "success": True,
+                "message": f"目录 {path} 创建成功"
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.get("/read/{filename:path}")
 def eeprom_read(filename: str):
     """读取指定文件内容"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        filename = check_path(filename)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        with fs.open(filename, "r") as f:
-            content = f.read()
+            content = fs.read_file(filename)
             return JSONResponse(content={
                 "success": True,
                 "filename": filename,
@@ -92,242 +190,623 @@ def eeprom_read(filename: str):
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"文件 {filename} 不存在")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
-@router.post("/write/{filename}")
-def eeprom_write(filename: str, file_content: FileContent):
-    """写入文件内容"""
+@router.post("/write/{filename:path}")
+def eeprom_write(filename: str, file_content: FileContent, offset: Optional[int] = None):
+    """
+    写入文件内容
+    未指定offset时覆盖整个文件，指定时从该字节偏移处写入且不截断文件
+    """
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        filename = check_path(filename)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        with fs.open(filename, "w") as f:
-            f.write(file_content.content)
+            if offset is None:
+                size = fs.write_file(filename, file_content.content)
+            else:
+                size = fs.write_at(filename, offset, file_content.content)
+            return JSONResponse(content={
+                "success": True,
+                "message": f"文件 {filename} 写入成功",
+                "size": size
+            })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"文件 {filename} 所在目录不存在")
+    except Exception as e:
+        raise http_error(e)
+
+@router.post("/flush")
+def eeprom_flush():
+    """
+    提交写回模式下暂存的全部写入，返回时数据已写入EEPROM
+    无法提交的写入(如空间不足)被丢弃，失败的文件和原因在错误详情中返回
+    """
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            count = fs.flush()
+            return JSONResponse(content={
+                "success": True,
+                "message": f"已提交 {count} 个文件的写入",
+                "flushed": count
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.get("/maintenance")
+def maintenance_status():
+    """获取空闲维护状态"""
+    try:
         return JSONResponse(content={
             "success": True,
-            "message": f"文件 {filename} 写入成功"
+            "maintenance": session.maintenance_control()
         })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
-@router.delete("/delete/{filename}")
-def eeprom_delete(filename: str):
-    """删除指定文件"""
+@router.post("/maintenance/{action}")
+def maintenance_control(action: str):
+    """控制空闲维护: pause暂停，resume恢复，run立即执行一轮"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
-            
-        fs.remove(filename)
+        try:
+            status = session.maintenance_control(action)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         return JSONResponse(content={
             "success": True,
-            "message": f"文件 {filename} 删除成功"
+            "maintenance": status
         })
+    except Exception as e:
+        raise http_error(e)
+
+@router.post("/append/{filename:path}")
+def eeprom_append(filename: str, file_content: FileContent):
+    """追加内容到文件末尾，文件不存在时创建"""
+    try:
+        filename = check_path(filename)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            size = fs.append_file(filename, file_content.content)
+            return JSONResponse(content={
+                "success": True,
+                "message": f"文件 {filename} 追加成功",
+                "size": size
+            })
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"文件 {filename} 所在目录不存在")
+    except Exception as e:
+        raise http_error(e)
+
+@router.delete("/delete/{filename:path}")
+def eeprom_delete(filename: str, recursive: bool = False):
+    """删除指定文件或目录"""
+    try:
+        filename = check_path(filename)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+            
+            fs.remove(filename, recursive=recursive)
+            return JSONResponse(content={
+                "success": True,
+                "message": f"文件 {filename} 删除成功"
+            })
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"文件 {filename} 不存在")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
-@router.post("/rename/{filename}")
+@router.post("/rename/{filename:path}")
 def eeprom_rename(filename: str, rename_request: RenameRequest):
     """重命名文件"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        filename = check_path(filename)
+        new_name = check_path(rename_request.new_name)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        # 检查源文件是否存在
-        try:
-            with fs.open(filename, "r") as f:
-                content = f.read()
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail=f"源文件 {filename} 不存在")
+            # 检查源文件是否存在
+            try:
+                content = fs.read_file(filename)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail=f"源文件 {filename} 不存在")
             
-        # 检查目标文件是否已存在
-        try:
-            with fs.open(rename_request.new_name, "r") as f:
-                raise HTTPException(status_code=400, detail=f"目标文件 {rename_request.new_name} 已存在")
-        except FileNotFoundError:
-            pass
+            # 检查目标文件是否已存在
+            try:
+                fs.read_file(new_name)
+                raise HTTPException(status_code=400, detail=f"目标文件 {new_name} 已存在")
+            except FileNotFoundError:
+                pass
             
-        # 写入新文件
-        with fs.open(rename_request.new_name, "w") as f:
-            f.write(content)
+            # 写入新文件
+            fs.write_file(new_name, content)
             
-        # 删除旧文件
-        fs.remove(filename)
+            # 删除旧文件
+            fs.remove(filename)
         
-        return JSONResponse(content={
-            "success": True,
-            "message": f"文件 {filename} 重命名为 {rename_request.new_name} 成功"
-        })
-    except HTTPException:
-        raise
+            return JSONResponse(content={
+                "success": True,
+                "message": f"文件 {filename} 重命名为 {new_name} 成功"
+            })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @router.get("/storage")
 def get_storage_info():
     """获取存储信息"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        info = fs.get_storage_info()
+            info = fs.get_storage_info()
         
-        # 添加人类可读的容量信息
-        def format_size(size):
-            for unit in ['B', 'KB', 'MB']:
-                if size < 1024:
-                    return f"{size:.2f} {unit}"
-                size /= 1024
-            return f"{size:.2f} MB"
+            # 添加人类可读的容量信息
+            def format_size(size):
+                for unit in ['B', 'KB', 'MB']:
+                    if size < 1024:
+                        return f"{size:.2f} {unit}"
+                    size /= 1024
+                return f"{size:.2f} MB"
             
-        # 计算使用率
-        used_percent = round(info["used"] / info["total"] * 100, 2) if info["total"] > 0 else 0
+            # 计算使用率
+            used_percent = round(info["used"] / info["total"] * 100, 2) if info["total"] > 0 else 0
             
-        return JSONResponse(content={
-            "success": True,
-            "storage": {
-                "total": info["total"],
-                "used": info["used"],
-                "free": info["free"],
-                "block_size": info["block_size"],
-                "block_count": info["block_count"],
-                "used_blocks": info["used_blocks"],
-                "formatted": {
-                    "total": format_size(info["total"]),
-                    "used": format_size(info["used"]),
-                    "free": format_size(info["free"]),
-                    "block_size": format_size(info["block_size"]),
-                    "usage": f"{used_percent}%"
+            return JSONResponse(content={
+                "success": True,
+                "storage": {
+                    "total": info["total"],
+                    "used": info["used"],
+                    "free": info["free"],
+                    "block_size": info["block_size"],
+                    "block_count": info["block_count"],
+                    "used_blocks": info["used_blocks"],
+                    "formatted": {
+                        "total": format_size(info["total"]),
+                        "used": format_size(info["used"]),
+                        "free": format_size(info["free"]),
+                        "block_size": format_size(info["block_size"]),
+                        "usage": f"{used_percent}%"
+                    }
                 }
-            }
-        })
+            })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @router.post("/batch/delete")
 def batch_delete(request: BatchDeleteRequest):
     """批量删除文件"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        results = []
-        for filename in request.filenames:
-            try:
-                fs.remove(filename)
-                results.append({
-                    "filename": filename,
-                    "success": True,
-                    "message": "删除成功"
-                })
-            except Exception as e:
-                results.append({
-                    "filename": filename,
-                    "success": False,
-                    "message": str(e)
-                })
+            results = []
+            for filename in request.filenames:
+                try:
+                    if is_reserved(filename):
+                        raise PermissionError(f"{filename} 为键值存储保留的文件")
+                    fs.remove(filename)
+                    results.append({
+                        "filename": filename,
+                        "success": True,
+                        "message": "删除成功"
+                    })
+                except Exception as e:
+                    results.append({
+                        "filename": filename,
+                        "success": False,
+                        "message": str(e)
+                    })
                 
-        return JSONResponse(content={
-            "success": True,
-            "results": results
-        })
+            return JSONResponse(content={
+                "success": True,
+                "results": results
+            })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+@router.post("/batch/read")
+def batch_read(request: BatchReadRequest):
+    """
+    批量读取文件，以NDJSON逐行返回每个文件的内容
+    文件按数据在设备上的位置顺序读取，使用同一个已挂载的文件系统
+    pattern为通配符时匹配所有文件的完整路径，例如 logs/*.txt
+    """
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            filenames = list(dict.fromkeys(request.filenames))
+            if request.pattern:
+                for entry in fs.walk():
+                    if entry["type"] == "file" and fnmatchcase(entry["path"], request.pattern) \
+                            and entry["path"] not in filenames and not is_reserved(entry["path"]):
+                        filenames.append(entry["path"])
+            filenames = fs.device_order(filenames)
+
+        def lines():
+            for filename in filenames:
+                try:
+                    if is_reserved(filename):
+                        raise PermissionError(f"{filename} 为键值存储保留的文件")
+                    result = {"filename": filename, "success": True, "content": fs.read_file(filename)}
+                except FileNotFoundError:
+                    result = {"filename": filename, "success": False, "message": f"文件 {filename} 不存在"}
+                except Exception as e:
+                    result = {"filename": filename, "success": False, "message": str(e)}
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(session.locked_iter(lines()), media_type="application/x-ndjson")
+    except Exception as e:
+        raise http_error(e)
 
 @router.post("/search")
 def search_files(request: SearchRequest):
     """搜索文件内容"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        results = []
-        for filename in fs.listdir():
-            try:
-                content = fs.read_file(filename)
-                if not request.case_sensitive:
-                    content = content.lower()
-                    keyword = request.keyword.lower()
-                else:
-                    keyword = request.keyword
+            results = []
+            for entry in fs.walk():
+                if entry["type"] != "file" or is_reserved(entry["path"]):
+                    continue
+                filename = entry["path"]
+                try:
+                    content = fs.read_file(filename)
+                    if not request.case_sensitive:
+                        content = content.lower()
+                        keyword = request.keyword.lower()
+                    else:
+                        keyword = request.keyword
                     
-                if keyword in content:
-                    results.append({
-                        "filename": filename,
-                        "matches": content.count(keyword)
-                    })
-            except:
-                continue
+                    if keyword in content:
+                        results.append({
+                            "filename": filename,
+                            "matches": content.count(keyword)
+                        })
+                except:
+                    continue
                 
-        return JSONResponse(content={
-            "success": True,
-            "keyword": request.keyword,
-            "case_sensitive": request.case_sensitive,
-            "results": results
-        })
+            return JSONResponse(content={
+                "success": True,
+                "keyword": request.keyword,
+                "case_sensitive": request.case_sensitive,
+                "results": results
+            })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
-@router.get("/file/info/{filename}")
+@router.get("/file/info/{filename:path}")
 def get_file_info(filename: str):
     """获取文件详细信息"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        filename = check_path(filename)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        try:
-            content = fs.read_file(filename)
-            return JSONResponse(content={
-                "success": True,
-                "file": {
-                    "name": filename,
-                    "size": len(content),
-                    "lines": len(content.splitlines()),
-                    "last_modified": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-            })
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail=f"文件 {filename} 不存在")
+            try:
+                content = fs.read_file(filename)
+                return JSONResponse(content={
+                    "success": True,
+                    "file": {
+                        "name": filename,
+                        "size": len(content),
+                        "lines": len(content.splitlines()),
+                        "last_modified": time.strftime("%Y-%m-%d %H:%M:%S")
+                    }
+                })
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail=f"文件 {filename} 不存在")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
-@router.post("/file/copy/{filename}")
+@router.post("/file/copy/{filename:path}")
 def copy_file(filename: str, new_name: str):
     """复制文件"""
     try:
-        fs = I2CEEPROMFileSystem()
-        if not fs.get_status()["i2c_connected"]:
-            raise HTTPException(status_code=503, detail="EEPROM未连接")
+        filename = check_path(filename)
+        new_name = check_path(new_name)
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
             
-        # 检查源文件是否存在
-        try:
-            content = fs.read_file(filename)
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail=f"源文件 {filename} 不存在")
+            # 检查源文件是否存在
+            try:
+                content = fs.read_file(filename)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail=f"源文件 {filename} 不存在")
             
-        # 检查目标文件是否已存在
-        try:
-            fs.read_file(new_name)
-            raise HTTPException(status_code=400, detail=f"目标文件 {new_name} 已存在")
-        except FileNotFoundError:
-            pass
+            # 检查目标文件是否已存在
+            try:
+                fs.read_file(new_name)
+                raise HTTPException(status_code=400, detail=f"目标文件 {new_name} 已存在")
+            except FileNotFoundError:
+                pass
             
-        # 写入新文件
-        fs.write_file(new_name, content)
+            # 写入新文件
+            fs.write_file(new_name, content)
         
+            return JSONResponse(content={
+                "success": True,
+                "message": f"文件 {filename} 复制为 {new_name} 成功"
+            })
+    except Exception as e:
+        raise http_error(e)
+
+
+@router.get("/kv")
+def kv_scan(prefix: str = "", after: Optional[str] = None, limit: int = 100):
+    """按键排序列出键值，after为上一页的最后一个键"""
+    try:
+        limit = max(1, min(limit, 1000))
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            items = fs.kv_scan(prefix, after, limit)
+            return JSONResponse(content={
+                "success": True,
+                "items": [{"key": key, "value": value} for key, value in items],
+                "next": items[-1][0] if len(items) == limit else None
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.put("/kv")
+def kv_put_many(request: KVItems):
+    """一次写入多个键值，所有记录一次追加"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                fs.kv_put_many(request.items)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return JSONResponse(content={
+                "success": True,
+                "message": f"写入 {len(request.items)} 个键成功"
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.get("/kv/{key:path}")
+def kv_get(key: str):
+    """读取键值，直接查询内存索引"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                value = fs.kv_get(key)
+            except KeyError:
+                raise HTTPException(status_code=404, detail=f"键 {key} 不存在")
+            return JSONResponse(content={
+                "success": True,
+                "key": key,
+                "value": value
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.put("/kv/{key:path}")
+def kv_put(key: str, item: KVValue):
+    """写入键值，只追加一条记录"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                fs.kv_put(key, item.value)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return JSONResponse(content={
+                "success": True,
+                "message": f"键 {key} 写入成功"
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.delete("/kv/{key:path}")
+def kv_delete(key: str):
+    """删除键"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                fs.kv_delete(key)
+            except KeyError:
+                raise HTTPException(status_code=404, detail=f"键 {key} 不存在")
+            return JSONResponse(content={
+                "success": True,
+                "message": f"键 {key} 已删除"
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.get("/image")
+def eeprom_image_dump():
+    """导出EEPROM完整镜像"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            return StreamingResponse(
+                session.locked_iter(fs.dump_image()),
+                media_type="application/octet-stream",
+                headers={
+                    "Content-Length": str(fs.size),
+                    "Content-Disposition": 'attachment; filename="eeprom.bin"'
+                }
+            )
+    except Exception as e:
+        raise http_error(e)
+
+@router.put("/image")
+def eeprom_image_restore(image: bytes = Body(..., media_type="application/octet-stream")):
+    """恢复EEPROM镜像，只写入有差异的页"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                written = fs.restore_image(image)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            return JSONResponse(content={
+                "success": True,
+                "pages_written": written,
+                "is_mounted": fs.is_mounted,
+                "message": "镜像恢复成功"
+            })
+    except Exception as e:
+        raise http_error(e)
+
+def hexdump(data, base: int = 0) -> List[str]:
+    """
+    十六进制转储，每行16字节
+    :param data: 数据
+    :param base: 第一个字节的地址
+    :return: 行列表，格式为 地址  十六进制  |ASCII|
+    """
+    lines = []
+    for pos in range(0, len(data), 16):
+        row = bytes(data[pos:pos + 16])
+        text = "".join(chr(b) if 0x20 <= b < 0x7f else "." for b in row)
+        lines.append(f"{base + pos:08x}  {row.hex(' '):<47}  |{text}|")
+    return lines
+
+@router.get("/raw")
+def eeprom_raw(offset: int = 0, length: int = 256, format: str = "bin"):
+    """
+    读取原始数据，bin返回二进制数据，hex返回十六进制转储
+    数据在会话锁内从设备镜像缓存复制一次，释放锁后其他请求的写入不会改变已返回的内容
+    """
+    try:
+        if format not in ("bin", "hex"):
+            raise HTTPException(status_code=400, detail="format只能为bin或hex")
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                data = bytes(fs.raw_view(offset, length))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        if format == "hex":
+            return JSONResponse(content={
+                "success": True,
+                "offset": offset,
+                "length": length,
+                "hex": hexdump(data, offset)
+            })
+        return Response(content=data, media_type="application/octet-stream")
+    except Exception as e:
+        raise http_error(e)
+
+@router.get("/raw/block/{block}")
+def eeprom_raw_block(block: int):
+    """查看块的原始数据和解析出的LittleFS元数据标签"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                info = fs.inspect_block(block)
+                view = fs.raw_view(info["offset"], info["size"])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            return JSONResponse(content={
+                "success": True,
+                **info,
+                "hex": hexdump(view, info["offset"])
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.post("/offline/open")
+def offline_open(request: OfflineImageRequest):
+    """打开本地镜像文件，之后的接口都作用于该镜像"""
+    try:
+        fs = session.open_image(request.path, request.writable)
         return JSONResponse(content={
             "success": True,
-            "message": f"文件 {filename} 复制为 {new_name} 成功"
+            "status": fs.get_status()
         })
-    except HTTPException:
-        raise
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"镜像文件 {request.path} 不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise http_error(e)
+
+@router.post("/offline/close")
+def offline_close():
+    """关闭离线镜像，恢复使用I2C设备"""
+    try:
+        session.close_image()
+        return JSONResponse(content={
+            "success": True,
+            "message": "已关闭离线镜像"
+        })
+    except Exception as e:
+        raise http_error(e)
+
+@router.post("/trace/start")
+def trace_start(request: TraceRequest):
+    """开始记录总线传输到跟踪文件"""
+    try:
+        with session.use() as fs:
+            if not fs.get_status()["i2c_connected"]:
+                raise HTTPException(status_code=503, detail="EEPROM未连接")
+
+            try:
+                fs.start_trace(request.path, request.snapshot)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return JSONResponse(content={
+                "success": True,
+                "message": f"开始记录总线传输到 {request.path}"
+            })
+    except Exception as e:
+        raise http_error(e)
+
+@router.post("/trace/stop")
+def trace_stop():
+    """停止记录总线传输"""
+    try:
+        with session.use(check_bus=False) as fs:
+            trace = fs.stop_trace()
+            return JSONResponse(content={
+                "success": trace is not None,
+                "trace": trace,
+                "message": "已停止记录" if trace is not None else "当前没有在记录"
+            })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
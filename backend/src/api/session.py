@@ -0,0 +1,472 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from timing import phase
+
+# 写回模式的提交延迟(毫秒)，未设置时写入同步完成
+WRITE_BEHIND_MS = float(os.environ.get("EEPROM_WRITE_BEHIND_MS", 0)) or None
+# 没有请求多久(毫秒)后开始空闲维护，0表示不启用
+MAINTENANCE_IDLE_MS = float(os.environ.get("EEPROM_MAINTENANCE_IDLE_MS", 2000))
+# 健康监测探测设备的间隔(毫秒)，0表示不启用
+HEALTH_INTERVAL_MS = float(os.environ.get("EEPROM_HEALTH_INTERVAL_MS", 2000))
+
+class DeviceUnavailableError(Exception):
+    """总线断路器已断开，设备暂不可用"""
+
+class FilesystemSession:
+    """
+    文件系统会话
+    在请求之间复用同一个已挂载的文件系统实例，驱动在首次使用时才导入，
+    所有操作通过会话锁串行访问总线
+    """
+
+    def __init__(self, broker: str = None, authkey: bytes = None, i2c=None):
+        """
+        :param broker: 总线代理进程地址，设置后所有操作转发给代理进程
+        :param authkey: 连接代理进程的认证密钥
+        :param i2c: 使用指定的I2C实例(如模拟设备)，默认打开CH347
+        """
+        self._lock = threading.RLock()
+        self._fs = None
+        self.image = None  # 已打开的离线镜像(ImageBuffer)
+        self.broker = broker
+        self.authkey = authkey
+        self.i2c = i2c
+        self.maintenance = None  # 空闲维护，start时启动
+        self.health = None  # 健康监测，start时启动
+        self.last_activity = time.monotonic()  # 最近一次请求结束的时间
+        self._requests = 0  # 正在等待或持有会话锁的请求数
+        self._activity_lock = threading.Lock()
+
+    def _create(self):
+        """创建文件系统实例，驱动模块在此处才导入"""
+        if self.broker:
+            from .broker import RemoteFilesystem
+            return RemoteFilesystem(self.broker, self.authkey)
+        from driver import I2CEEPROMFileSystem, ImageEEPROMFileSystem
+        if self.image is not None:
+            return ImageEEPROMFileSystem(self.image)
+        fs = I2CEEPROMFileSystem(i2c=self.i2c)
+        if WRITE_BEHIND_MS:
+            fs.enable_write_behind(WRITE_BEHIND_MS / 1000, self._lock)
+        return fs
+
+    def mount(self):
+        """导入驱动并挂载设备"""
+        with self._lock:
+            if self._fs is None or not self._fs.i2c_connected:
+                with phase("mount"):
+                    old, self._fs = self._fs, self._create()
+                if old is not None:
+                    self._carry_over(old, self._fs)
+            return self._fs
+
+    @staticmethod
+    def _carry_over(old, new):
+        """
+        重新连接后把旧实例暂存的写入转交给新实例，并停止旧实例的后台提交
+        旧实例的适配器已断开，在旧实例上提交必然失败，改由新实例提交
+        """
+        write_behind = getattr(old, "write_behind", None)
+        if write_behind is None:
+            return
+        old.write_behind = None
+        entries = write_behind.detach()
+        if entries:
+            new.enable_write_behind(write_behind.delay, write_behind.lock)
+            new.write_behind.adopt(entries)
+
+    def start(self):
+        """在后台线程中挂载设备，不阻塞启动"""
+        def run():
+            try:
+                self.mount()
+            except Exception as e:
+                print(f"后台挂载EEPROM失败: {str(e)}")
+
+        thread = threading.Thread(target=run, name="eeprom-mount", daemon=True)
+        thread.start()
+        # 多进程运行时由代理进程维护和监测
+        if self.maintenance is None and not self.broker and MAINTENANCE_IDLE_MS:
+            self.maintenance = Maintenance(self, MAINTENANCE_IDLE_MS / 1000).start()
+        if self.health is None and not self.broker and HEALTH_INTERVAL_MS:
+            self.health = HealthMonitor(self, HEALTH_INTERVAL_MS / 1000).start()
+        return thread
+
+    def status(self) -> dict:
+        """
+        当前状态，设备是否应答由健康监测定期更新
+        已挂载后不持有会话锁也不访问总线；尚未挂载(启动时的后台挂载未完成)时先挂载一次，
+        避免在首次探测前报告设备未连接
+        :return: 文件系统状态，启用健康监测时附带health
+        """
+        fs = self._fs
+        if fs is None:
+            try:
+                fs = self.mount()
+            except Exception as e:
+                print(f"挂载EEPROM失败: {str(e)}")
+        if self.broker and fs is not None:
+            return fs.call("session", "status")
+        if fs is None:
+            status = {"i2c_connected": False, "is_mounted": False, "bus_available": False, "pending_writes": 0}
+        else:
+            status = fs.get_status()
+        if self.health is not None:
+            status["health"] = self.health.status()
+        return status
+
+    @property
+    def busy(self) -> bool:
+        """是否有请求正在等待或持有会话锁"""
+        return self._requests > 0
+
+    def _enter(self):
+        with self._activity_lock:
+            self._requests += 1
+
+    def _leave(self):
+        with self._activity_lock:
+            self._requests -= 1
+            self.last_activity = time.monotonic()
+
+    @contextmanager
+    def use(self, check_bus: bool = True):
+        """
+        持有会话锁使用文件系统，设备未连接时会重新尝试连接
+        :param check_bus: 断路器断开时直接抛出DeviceUnavailableError，不访问总线
+        """
+        self._enter()
+        try:
+            with phase("lock"):
+                self._lock.acquire()
+            try:
+                fs = self.mount()
+                if check_bus and not fs.bus_available:
+                    raise DeviceUnavailableError("EEPROM不可用，请检查设备连接")
+                with phase("lfs"):
+                    yield fs
+            finally:
+                self._lock.release()
+        finally:
+            self._leave()
+
+    def device_unavailable(self) -> bool:
+        """设备是否因总线连续故障而不可用"""
+        fs = self._fs
+        try:
+            return fs is not None and not fs.bus_available
+        except Exception:
+            return True  # 通过代理进程查询失败时同样视为不可用
+
+    def locked_iter(self, iterable):
+        """逐段持有会话锁迭代，用于流式响应，客户端中途断开也不会长期占用锁"""
+        iterator = iter(iterable)
+        while True:
+            self._enter()
+            try:
+                with self._lock:
+                    chunk = next(iterator, None)
+            finally:
+                self._leave()
+            if chunk is None:
+                return
+            yield chunk
+
+    def open_image(self, path: str, writable: bool = False):
+        """
+        打开本地镜像文件，之后的操作都作用于该镜像
+        :return: 镜像文件系统实例
+        """
+        if self.broker:
+            fs = self.mount()
+            fs.call("session", "open_image", path, writable)
+            return fs
+        from driver import ImageEEPROMFileSystem, ImageBuffer
+        image = ImageBuffer(path, writable)
+        try:
+            fs = ImageEEPROMFileSystem(image)
+        except ValueError:
+            image.close()
+            raise
+        with self._lock:
+            try:
+                self.close()
+            except Exception:
+                image.close()
+                raise
+            if self.image is not None:
+                self.image.close()
+            self.image = image
+            self._fs = fs
+        return fs
+
+    def close_image(self):
+        """关闭离线镜像，恢复使用I2C设备"""
+        if self.broker:
+            self.mount().call("session", "close_image")
+            return
+        with self._lock:
+            if self.image is not None:
+                self.image.close()
+                self.image = None
+                self._fs = None
+
+    def maintenance_control(self, action: str = None) -> dict:
+        """
+        控制空闲维护
+        :param action: pause暂停，resume恢复，run立即执行一轮(仍会让出给请求)，None只查询状态
+        :return: 维护状态
+        """
+        if self.broker:
+            return self.mount().call("session", "maintenance_control", action)
+        if action is not None:
+            if self.maintenance is None:
+                raise ValueError("空闲维护未启用")
+            if action not in ("pause", "resume", "run"):
+                raise ValueError(f"不支持的操作 {action}")
+            getattr(self.maintenance, action)()
+        if self.maintenance is None:
+            return {"enabled": False}
+        return self.maintenance.status()
+
+    def close(self) -> int:
+        """
+        提交写回模式下暂存的写入并停止后台提交，在切换设备或退出前调用
+        :return: 提交的文件数
+        """
+        with self._lock:
+            if self._fs is None:
+                return 0
+            return self._fs.close_write_behind()
+
+
+class Maintenance:
+    """
+    空闲维护
+    会话超过idle秒没有请求后，后台线程逐步执行文件系统的维护步骤(见I2CEEPROMFileSystem.maintenance_steps)，
+    每步单独持有会话锁，每步之前检查是否有请求到达，有则立即让出，等下次空闲再从头开始
+    """
+
+    def __init__(self, session: FilesystemSession, idle: float = 2.0):
+        """
+        :param session: 文件系统会话
+        :param idle: 没有请求多久(秒)后开始维护
+        """
+        self.session = session
+        self.idle = idle
+        self.paused = False
+        self.running = False
+        self.passes = 0  # 完成的维护轮数
+        self.yielded = 0  # 因请求到达而中断的次数
+        self.steps = Counter()  # 各步骤执行次数
+        self.last_run = None  # 最近一次完成维护的时间
+        self.error = None  # 最近一次维护失败的原因
+        self._activity = None  # 上次完成维护时的会话活动时间，之后没有新请求时不再维护
+        self._triggered = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="eeprom-maintenance", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        with self._cond:
+            self.paused = False
+            self._cond.notify()
+
+    def run(self):
+        """不等待空闲立即执行一轮"""
+        with self._cond:
+            self._triggered = True
+            self._cond.notify()
+
+    def status(self) -> dict:
+        return {
+            "enabled": True,
+            "paused": self.paused,
+            "running": self.running,
+            "idle_ms": self.idle * 1000,
+            "passes": self.passes,
+            "yielded": self.yielded,
+            "steps": dict(self.steps),
+            "last_run": self.last_run,
+            "error": self.error
+        }
+
+    def _next_wait(self):
+        """距可以开始维护的时间，返回0表示可以开始，None表示等待恢复"""
+        if self.paused:
+            return None
+        session = self.session
+        if session.busy:
+            return self.idle
+        if self._triggered:
+            return 0
+        if session.last_activity == self._activity:
+            return self.idle  # 上次维护之后没有请求，定期检查
+        return max(self.idle - (time.monotonic() - session.last_activity), 0.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    wait = self._next_wait()
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+                self._triggered = False
+            self._run_pass()
+
+    def _run_pass(self):
+        session = self.session
+        activity = session.last_activity
+        fs = session._fs
+        if fs is None or not hasattr(fs, "maintenance_steps"):
+            self._activity = activity
+            return
+        steps = fs.maintenance_steps()
+        self.running = True
+        try:
+            while True:
+                if session.busy or self.paused:
+                    self.yielded += 1
+                    return
+                with session._lock:
+                    # 等待锁期间可能有请求到达或切换了设备
+                    if session.busy or self.paused or session._fs is not fs:
+                        self.yielded += 1
+                        return
+                    step = next(steps, None)
+                if step is None:
+                    break
+                self.steps[step] += 1
+            self.passes += 1
+            self.last_run = time.time()
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            print(f"空闲维护失败: {str(e)}")
+        finally:
+            steps.close()
+            self.running = False
+        self._activity = activity
+
+
+class HealthMonitor:
+    """
+    健康监测
+    后台线程每隔interval秒用最小的传输探测设备，记录是否应答和探测失败率；
+    I2C未连接时尝试重新连接，设备重新出现或应答但未挂载时重新挂载。有请求在使用总线时跳过本次探测
+    """
+
+    MAX_RETRY_PROBES = 64  # 挂载失败后重试间隔的上限(探测次数)
+
+    def __init__(self, session: FilesystemSession, interval: float = 2.0, window: int = 30):
+        """
+        :param session: 文件系统会话
+        :param interval: 探测间隔(秒)
+        :param window: 统计失败率的最近探测次数
+        """
+        self.session = session
+        self.interval = interval
+        self.present = None  # 设备最近一次是否应答，尚未探测时为None
+        self.probes = 0
+        self.failures = 0
+        self.remounts = 0
+        self.mount_failures = 0  # 设备应答但连续挂载失败的次数
+        self.last_probe = None  # 最近一次探测的时间
+        self.probe_ms = None  # 最近一次探测耗时
+        self.last_change = None  # 设备出现或消失的时间
+        self.error = None  # 最近一次重新连接或挂载失败的原因
+        self._retry_at = 0  # 挂载失败后，探测次数达到该值时才再次尝试挂载
+        self._recent = deque(maxlen=window)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="eeprom-health", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        return {
+            "present": self.present,
+            "interval_ms": self.interval * 1000,
+            "probes": self.probes,
+            "failures": self.failures,
+            "error_rate": round(self._recent.count(False) / len(self._recent), 3) if self._recent else None,
+            "remounts": self.remounts,
+            "mount_failures": self.mount_failures,
+            "last_probe": self.last_probe,
+            "probe_ms": self.probe_ms,
+            "last_change": self.last_change,
+            "error": self.error
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.error = str(e)
+                print(f"健康监测失败: {str(e)}")
+
+    def check(self):
+        """探测一次设备，必要时重新连接或挂载"""
+        session = self.session
+        if session.busy:
+            return  # 请求的传输结果已计入断路器
+        with session._lock:
+            fs = session._fs
+            start = time.perf_counter()
+            if fs is None or not fs.i2c_connected:
+                # 适配器未打开，重新创建文件系统(打开I2C并挂载)
+                fs = session.mount()
+                present = fs.i2c_connected and fs.probe()
+                if present and not fs.is_mounted:
+                    self._mount_failed()
+            else:
+                present = fs.probe()
+                # 设备重新出现时内容可能已被修改，立即重新挂载；
+                # 一直应答但未挂载的(如未格式化)按退避间隔重试，不在每次探测时重复挂载
+                if present and (self.present is False or (not fs.is_mounted and self.probes >= self._retry_at)):
+                    if fs.remount():
+                        self.remounts += 1
+                    else:
+                        self._mount_failed()
+            if present and fs.is_mounted:
+                self.mount_failures = 0
+            self.probe_ms = round((time.perf_counter() - start) * 1000, 2)
+        self._record(present)
+
+    def _mount_failed(self):
+        """记录挂载失败，之后每次失败把重试间隔(探测次数)加倍"""
+        self.mount_failures += 1
+        self.error = "设备应答但挂载失败"
+        self._retry_at = self.probes + min(2 ** self.mount_failures, self.MAX_RETRY_PROBES)
+
+    def _record(self, present: bool):
+        self.probes += 1
+        self.last_probe = time.time()
+        self._recent.append(present)
+        if not present:
+            self.failures += 1
+        if present != self.present:
+            self.last_change = self.last_probe
+            if self.present is not None:
+                print("EEPROM已重新连接" if present else "EEPROM无应答")
+        self.present = present
+
+
+# 多进程运行时由启动进程设置代理地址，见web.py
+session = FilesystemSession(os.environ.get("EEPROM_BROKER"),
+                            bytes.fromhex(os.environ.get("EEPROM_BROKER_AUTHKEY", "")))
@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from fastapi.responses import JSONResponse as _JSONResponse
+from timing import RequestTimings, phase
+
+logger = logging.getLogger("timing")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(levelname)s:     %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# 慢请求采样阈值(毫秒)，未设置时不启用采样
+PROFILE_SLOW_MS = float(os.environ.get("EEPROM_PROFILE_SLOW_MS", 0)) or None
+
+
+class JSONResponse(_JSONResponse):
+    """序列化耗时计入serialize阶段的JSONResponse"""
+
+    def render(self, content) -> bytes:
+        with phase("serialize"):
+            return super().render(content)
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+    按固定间隔采集执行过计时阶段的线程的调用栈，用于定位慢请求的耗时位置
+    """
+
+    def __init__(self, timings: RequestTimings, interval: float = 0.001):
+        self.timings = timings
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.timings.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame, limit: int = 24) -> str:
+        """把调用栈折叠为一行，最外层在前"""
+        stack = []
+        while frame is not None and len(stack) < limit:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def report(self, limit: int = 10) -> list:
+        """返回采样次数最多的调用栈"""
+        return [{"samples": count, "stack": stack} for stack, count in self.samples.most_common(limit)]
+
+
+def log_request(method: str, path: str, status: int, timings: RequestTimings, total: float, profile: list = None):
+    """输出一行结构化的请求耗时日志"""
+    record = {
+        "method": method,
+        "path": path,
+        "status": status,
+        "total_ms": round(total * 1000, 2),
+        "phases_ms": {name: round(value * 1000, 2) for name, value in timings.phases.items()},
+        "app_ms": round(timings.app_time(total) * 1000, 2),
+    }
+    if profile:
+        record["profile"] = profile
+    logger.info(json.dumps(record, ensure_ascii=False))
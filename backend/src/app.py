@@ -1,32 +1,68 @@
-import random
 import socket
 import threading
+import time
 
-import webview
-from web import app
 import uvicorn
 
 
-def get_unused_port():
-    """获取未被使用的端口"""
-    while True:
-        port = random.randint(1024, 65535)  # 端口范围一般为1024-65535
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            sock.bind(("localhost", port))
-            sock.close()
-            return port
-        except OSError:
-            pass
+def bind_socket(host: str = "127.0.0.1") -> socket.socket:
+    """绑定监听端口，由系统分配空闲端口，同一个socket直接交给uvicorn使用"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind((host, 0))
+    sock.listen(128)
+    return sock
 
 
-port = get_unused_port()
+def start_server(sock: socket.socket):
+    """
+    在后台线程中启动FastAPI服务
+    :param sock: 已绑定的监听socket
+    :return: uvicorn服务实例和所在线程
+    """
+    # 以导入字符串传入，web模块在服务线程中加载，与主线程导入webview并行
+    server = uvicorn.Server(uvicorn.Config("web:app"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="uvicorn", daemon=True)
+    thread.start()
+    return server, thread
 
-# 启动FastAPI服务
-t = threading.Thread(target=uvicorn.run, args=(app,), kwargs={"port": port})
-t.daemon = True
-t.start()
 
-# 在PyWebview应用程序中加载FastAPI应用程序的URL
-webview.create_window('FastAPI Desktop', f'http://localhost:{port}')
-webview.start()
+def wait_ready(server: uvicorn.Server, thread: threading.Thread, timeout: float = 30):
+    """等待uvicorn完成启动，开始接受连接"""
+    deadline = time.monotonic() + timeout
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("FastAPI服务启动失败")
+        if time.monotonic() > deadline:
+            raise TimeoutError("等待FastAPI服务启动超时")
+        time.sleep(0.005)
+
+
+def stop_server(server: uvicorn.Server, thread: threading.Thread):
+    """
+    通知uvicorn退出并等待服务线程结束
+    服务线程中的uvicorn不处理信号，窗口关闭后必须主动停止，lifespan的关闭流程(提交暂存的写入)才会执行
+    """
+    server.should_exit = True
+    thread.join()
+
+
+def main():
+    sock = bind_socket()
+    host, port = sock.getsockname()
+
+    # 启动FastAPI服务
+    server, thread = start_server(sock)
+
+    import webview
+
+    # 服务就绪后再在PyWebview应用程序中加载FastAPI应用程序的URL
+    wait_ready(server, thread)
+    webview.create_window('FastAPI Desktop', f'http://{host}:{port}')
+    webview.start()
+
+    # 窗口关闭后停止服务，等待暂存的写入提交到设备
+    stop_server(server, thread)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Vite构建产物位于assets目录，文件名带内容哈希，例如 assets/index-3f2a9c1d.js
+HASHED_NAME = re.compile(r"^assets/.*[-.][0-9A-Za-z_-]{8}\.[0-9A-Za-z]+$")
+
+# 可压缩的类型，图片等已压缩格式不再压缩
+COMPRESSIBLE = {".html", ".js", ".mjs", ".css", ".svg", ".json", ".map", ".txt", ".xml", ".ico"}
+
+# Windows注册表中的MIME类型可能不正确，常用类型显式指定
+MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".mjs": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".svg": "image/svg+xml",
+    ".json": "application/json",
+}
+
+# 小于该大小的文件压缩收益不明显
+MIN_COMPRESS_SIZE = 1024
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def precompress(directory: str):
+    """
+    为静态目录中的可压缩文件生成.gz和.br文件，供打包前调用
+    :param directory: 静态文件目录
+    :return: 生成的文件数
+    """
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            ext = os.path.splitext(name)[1]
+            if ext not in COMPRESSIBLE:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as fh:
+                data = fh.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path + ".gz", "wb") as fh:
+                fh.write(gzip.compress(data, 9, mtime=0))
+            count += 1
+            if brotli is not None:
+                with open(path + ".br", "wb") as fh:
+                    fh.write(brotli.compress(data))
+                count += 1
+    return count
+
+
+class Asset:
+    """内存中的静态文件及其压缩版本"""
+    def __init__(self, name: str, data: bytes, variants: dict):
+        ext = os.path.splitext(name)[1]
+        self.media_type = MEDIA_TYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.data = data
+        self.variants = variants  # 编码 -> 压缩后的数据
+        self.etag = '"%s"' % hashlib.blake2b(data, digest_size=8).hexdigest()
+        self.cache_control = IMMUTABLE if HASHED_NAME.search(name) else REVALIDATE
+
+
+class StaticAssets:
+    """
+    启动时把前端构建产物加载到内存
+    按Accept-Encoding返回预压缩的br/gzip版本，带哈希的文件长期缓存，其余文件通过ETag重新验证
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._assets = {}
+        self.load()
+
+    def load(self):
+        """加载目录中的所有文件，.gz/.br文件作为对应文件的压缩版本"""
+        if not os.path.isdir(self.directory):
+            print(f"静态文件目录 {self.directory} 不存在")
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith((".gz", ".br")):
+                    continue
+                path = os.path.relpath(os.path.join(root, name), self.directory)
+                self._load_file(path.replace(os.sep, "/"))
+
+    def _load_file(self, path: str):
+        full_path = os.path.join(self.directory, path)
+        with open(full_path, "rb") as fh:
+            data = fh.read()
+
+        variants = {}
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if os.path.isfile(full_path + suffix):
+                with open(full_path + suffix, "rb") as fh:
+                    variants[encoding] = fh.read()
+        # 没有预压缩文件时在加载时压缩一次
+        if ("gzip" not in variants and len(data) >= MIN_COMPRESS_SIZE
+                and os.path.splitext(path)[1] in COMPRESSIBLE):
+            variants["gzip"] = gzip.compress(data, 6, mtime=0)
+
+        asset = Asset(path, data, variants)
+        self._assets[path] = asset
+        return asset
+
+    def get(self, path: str) -> Asset:
+        """获取静态文件，不在缓存中时尝试从磁盘加载"""
+        asset = self._assets.get(path)
+        if asset is not None:
+            return asset
+        full_path = os.path.realpath(os.path.join(self.directory, path))
+        if not full_path.startswith(os.path.realpath(self.directory) + os.sep) or not os.path.isfile(full_path):
+            return None
+        return self._load_file(path)
+
+    def response(self, path: str, request: Request) -> Response:
+        """
+        生成静态文件响应
+        :param path: 相对静态目录的路径
+        :param request: 请求，用于读取Accept-Encoding和If-None-Match
+        """
+        asset = self.get(path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail=f"文件 {path} 不存在")
+
+        data = asset.data
+        etag = asset.etag
+        headers = {
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and encoding in accepted:
+                data = asset.variants[encoding]
+                # 不同编码的内容不同，ETag也要区分
+                etag = f'{asset.etag[:-1]}-{encoding}"'
+                headers["Content-Encoding"] = encoding
+                break
+        headers["ETag"] = etag
+
+        if etag in request.headers.get("if-none-match", ""):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return Response(content=data, media_type=asset.media_type, headers=headers)
+
+
+def accepted_encodings(header: str) -> set:
+    """解析Accept-Encoding，忽略q=0的编码"""
+    encodings = set()
+    for item in header.split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0]:
+            continue
+        if any(p.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000") for p in parts[1:]):
+            continue
+        encodings.add(parts[0].lower())
+    return encodings
@@ -1 +1,2 @@
 from .eeprom import I2CEEPROMFileSystem
+from .image import ImageEEPROMFileSystem, ImageBuffer
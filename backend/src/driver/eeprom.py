@@ -1,45 +1,246 @@
-from littlefs import LittleFS, UserContext
+from littlefs import LittleFS, UserContext, LittleFSError, FileHandle, LFSStat
 from i2cpy import I2C, errors
+from timing import phase
 import time
 
+class CircuitBreaker:
+    """
+    总线断路器
+    连续失败的传输达到阈值后断开，冷却期内的传输直接失败，不再等待总线超时；
+    冷却期过后放行一次传输试探设备是否恢复
+    """
+    def __init__(self, threshold: int = 3, reset_timeout: float = 2.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        """断路器是否处于断开状态(冷却期内)"""
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def check(self):
+        """断开时直接抛出异常"""
+        if self.is_open:
+            raise errors.I2COperationFailedError("I2C传输", "设备不可用，断路器已断开")
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def reset(self):
+        self.success()
+
+
 class EEPROMBuffer:
     """直接映射EEPROM数据的缓冲区"""
-    def __init__(self, i2c: I2C, eeprom_addr: int = 0x50, addrsize=16):
+    def __init__(self, i2c: I2C, eeprom_addr: int = 0x50, addrsize=16, page_size=64, max_read_size=4096,
+                 breaker: CircuitBreaker = None, cache_size: int = None):
         self.i2c = i2c
         self.eeprom_addr = eeprom_addr
         self.addrsize = addrsize
+        self.page_size = page_size
+        self.max_read_size = max_read_size  # 单次顺序读取的最大长度
+        self.write_delay = 0.005  # 页写入等待时间
+        self.retries = 3  # 单次传输失败后的重试次数
+        self.retry_delay = 0.002  # 首次重试等待时间，之后每次翻倍
+        self.breaker = breaker or CircuitBreaker()
+        # 设备镜像缓存，按页记录是否已缓存；读取的整页数据保留在缓存中，写入同时更新缓存
+        # 已缓存的区间直接从内存读取，不访问总线
+        self.cache = bytearray(cache_size) if cache_size else None
+        self._cached = bytearray(-(-cache_size // page_size)) if cache_size else None
+        self.generation = 0  # 写入计数，用于判断设备内容是否变化
+
+    def _transfer(self, func, *args, **kwargs):
+        """
+        执行一次总线传输，失败时退避重试，消除噪声等引起的偶发NACK
+        重试耗尽计为一次失败，连续失败由断路器处理
+        """
+        self.breaker.check()
+        delay = self.retry_delay
+        with phase("bus"):
+            for attempt in range(self.retries + 1):
+                try:
+                    result = func(*args, **kwargs)
+                    self.breaker.success()
+                    return result
+                except (errors.I2CError, OSError):
+                    if attempt == self.retries:
+                        self.breaker.failure()
+                        raise
+                    time.sleep(delay)
+                    delay *= 2
         
+    def probe(self) -> bool:
+        """
+        用最小的传输(读取1字节)检查设备是否应答
+        不重试也不受断路器限制，结果计入断路器，设备恢复后断路器随之关闭
+        :return: 设备是否应答
+        """
+        try:
+            with phase("bus"):
+                self.i2c.readfrom_mem(self.eeprom_addr, 0, 1, addrsize=self.addrsize)
+        except (errors.I2CError, OSError):
+            self.breaker.failure()
+            return False
+        self.breaker.success()
+        return True
+
     def __getitem__(self, addr: slice) -> int:
         # 处理切片操作
         start = addr.start 
         end = addr.stop 
         size = end - start
         if size > 0:
-            return self.i2c.readfrom_mem(self.eeprom_addr, start, size, addrsize=self.addrsize)
+            if self.is_cached(start, size):
+                return bytes(self.cache[start:end])
+            data = self._transfer(self.i2c.readfrom_mem, self.eeprom_addr, start, size, addrsize=self.addrsize)
+            self._fill_cache(start, data)
+            return data
         return b''
         
     def __setitem__(self, addr: slice, value: list | bytes):
         start = addr.start 
-        page_size = 64
+        page_size = self.page_size
         if isinstance(value, list):
             for i in range(0, len(value), page_size):
-                self.i2c.writeto_mem(self.eeprom_addr, start+i, bytes(value[i:i+page_size]), addrsize=self.addrsize)
-                time.sleep(0.005)  # 等待写入完成
+                self._write_page(start+i, bytes(value[i:i+page_size]))
         elif isinstance(value, bytes):
             for i in range(0, len(value), page_size):
-                self.i2c.writeto_mem(self.eeprom_addr, start+i, value[i:i+page_size], addrsize=self.addrsize)
-                time.sleep(0.005)  # 等待写入完成
+                self._write_page(start+i, value[i:i+page_size])
+
+    def _write_page(self, addr: int, data: bytes):
+        """写入一页并等待写入完成"""
+        self.generation += 1
+        try:
+            self._transfer(self.i2c.writeto_mem, self.eeprom_addr, addr, data, addrsize=self.addrsize)
+        except Exception:
+            # 写入失败时设备上该页的内容不确定，下次访问重新读取
+            self._drop_cache(addr, len(data))
+            raise
+        if self.cache is not None and addr + len(data) <= len(self.cache):
+            self.cache[addr:addr + len(data)] = data
+        with phase("page_wait"):
+            time.sleep(self.write_delay)  # 等待写入完成
+
+    def _fill_cache(self, start: int, data: bytes):
+        """把读取的数据放入缓存，只标记完整覆盖的页"""
+        if self.cache is None or start + len(data) > len(self.cache):
+            return
+        self.cache[start:start + len(data)] = data
+        first = -(-start // self.page_size)
+        last = (start + len(data)) // self.page_size
+        self._cached[first:last] = b"\x01" * max(last - first, 0)
+
+    def is_cached(self, start: int, size: int) -> bool:
+        """区间内的页是否都已缓存"""
+        if self.cache is None or start + size > len(self.cache):
+            return False
+        return all(self._cached[start // self.page_size:-(-(start + size) // self.page_size)])
+
+    def _drop_cache(self, start: int, size: int):
+        if self.cache is None:
+            return
+        first = start // self.page_size
+        last = min(-(-(start + size) // self.page_size), len(self._cached))
+        self._cached[first:last] = bytes(max(last - first, 0))
+
+    def view(self, start: int, size: int) -> memoryview:
+        """
+        零拷贝获取设备数据，未缓存的页合并为连续区间顺序读取
+        返回的视图直接引用缓存，之后的写入会反映在视图中
+        :param start: 起始地址
+        :param size: 长度
+        :return: 缓存区域的memoryview
+        """
+        if self.cache is None:
+            raise RuntimeError("未启用设备镜像缓存")
+        page = self.page_size
+        first = start // page
+        last = -(-(start + size) // page)
+        index = first
+        while index < last:
+            if self._cached[index]:
+                index += 1
+                continue
+            run = index
+            while index < last and not self._cached[index]:
+                index += 1
+            for _ in self.read_sequential(run * page, min(index * page, len(self.cache)) - run * page):
+                pass  # __getitem__已把读取的数据放入缓存
+        return memoryview(self.cache)[start:start + size]
+
+    def invalidate_cache(self):
+        """丢弃全部缓存，设备可能被其他主机修改时使用"""
+        if self.cache is not None:
+            self._drop_cache(0, len(self.cache))
+
+    def read_sequential(self, start: int, size: int, chunk_size: int = None):
+        """
+        以最大长度分段顺序读取
+        :param start: 起始地址
+        :param size: 读取长度
+        :param chunk_size: 每段长度，默认为max_read_size
+        :return: 生成器，逐段返回读取的数据
+        """
+        chunk_size = chunk_size or self.max_read_size
+        end = start + size
+        for offset in range(start, end, chunk_size):
+            yield self[offset:min(offset + chunk_size, end)]
+
+    def write_diff(self, start: int, data: bytes) -> int:
+        """
+        只写入与当前内容不同的页
+        :param start: 起始地址
+        :param data: 要写入的数据
+        :return: 实际写入的页数
+        """
+        current = b''.join(self.read_sequential(start, len(data)))
+        end = start + len(data)
+        written = 0
+        pos = start
+        while pos < end:
+            # 按EEPROM物理页边界切分，避免页内地址回绕
+            page_end = min((pos // self.page_size + 1) * self.page_size, end)
+            chunk = data[pos - start:page_end - start]
+            if current[pos - start:page_end - start] != chunk:
+                self._write_page(pos, bytes(chunk))
+                written += 1
+            pos = page_end
+        return written
+
+
+class SafeFileHandle(FileHandle):
+    """
+    关闭失败时同样标记为已关闭
+    写入时总线故障会使LittleFS关闭文件失败，但文件已从打开列表中移除，析构时再次关闭会触发断言使进程退出
+    """
+    def close(self):
+        try:
+            super().close()
+        finally:
+            setattr(self, "__IOBase_closed", True)
 
 
 class EEPROMContext(UserContext):
     """EEPROM用户上下文"""
-    def __init__(self, i2c: I2C, eeprom_addr: int = 0x50):
-        self.buffer = EEPROMBuffer(i2c, eeprom_addr)
+    def __init__(self, i2c: I2C, eeprom_addr: int = 0x50, breaker: CircuitBreaker = None, size: int = None):
+        self.buffer = EEPROMBuffer(i2c, eeprom_addr, breaker=breaker, cache_size=size)
+
+    def erase(self, cfg, block: int) -> int:
+        """EEPROM可以直接覆盖写入，不需要擦除，分配新块时省去整块写0xFF"""
+        return 0
 
 class I2CEEPROMFileSystem(LittleFS):
     """I2C EEPROM文件系统，使用LittleFS格式"""
     
-    def __init__(self,  eeprom_addr: int = 0x50, block_size=512, block_count=64):
+    def __init__(self,  eeprom_addr: int = 0x50, block_size=512, block_count=64, i2c: I2C = None):
         """
         初始化I2C EEPROM文件系统
         :param i2c: I2C实例，如果为None则自动创建
@@ -53,6 +254,14 @@ class I2CEEPROMFileSystem(LittleFS):
         
         self.i2c_connected = False
         self.is_mounted = False
+        self.breaker = CircuitBreaker()
+        self._i2c = i2c  # 外部传入的I2C实例(如模拟设备)，重连时复用
+        self.trace = None  # 正在记录总线传输的RecordingI2C
+        self.write_behind = None  # 写回缓存，启用后写入先暂存再由后台线程提交
+        self._prog_size = 64  # 按EEPROM页写入，元数据提交在块内追加，块写满时才需要压缩
+        self._used_blocks = None  # (写入计数, 已用块数)，设备内容未变化时复用
+        self._gc_generation = None  # 上次空闲压缩时的写入计数
+        self._kv = None  # 键值存储，挂载后首次使用时加载
         self._connect_i2c()
         if self.i2c_connected:
             self._initialize_filesystem(block_size, block_count)
@@ -60,7 +269,11 @@ class I2CEEPROMFileSystem(LittleFS):
     def _connect_i2c(self):
         """尝试连接I2C设备"""
         try:
-            self.i2c = I2C()  # 使用默认配置
+            self.i2c = self._i2c or I2C()  # 使用默认配置
+            if self.trace is not None:
+                # 重连后继续记录
+                self.trace.i2c = self.i2c
+                self.i2c = self.trace
             self.i2c_connected = True
             return True
         except errors.I2CInvalidDriverError:
@@ -74,19 +287,30 @@ class I2CEEPROMFileSystem(LittleFS):
             return False
             
         # 创建EEPROM上下文
-        context = EEPROMContext(self.i2c, self.eeprom_addr)
+        context = self._create_context()
         
         # 初始化LittleFS，传入EEPROM上下文
-        super().__init__(context=context, block_size=block_size, block_count=block_count, mount=False)
+        super().__init__(context=context, block_size=block_size, block_count=block_count,
+                         prog_size=self._prog_size, mount=False)
         try:
             self.mount()
             self.is_mounted = True
             return True
-        except errors.LittleFSError:
+        except LittleFSError:
             print("加载EEPROM失败")
             self.is_mounted = False
             return False
 
+    def mount(self):
+        """挂载文件系统，耗时计入mount阶段"""
+        with phase("mount"):
+            self._kv = None  # 设备内容可能已变化，重新加载键值存储
+            return super().mount()
+
+    def _create_context(self):
+        """创建LittleFS使用的存储上下文"""
+        return EEPROMContext(self.i2c, self.eeprom_addr, self.breaker, self.size)
+
     def reconnect(self):
         """
         重新连接I2C设备
@@ -94,48 +318,457 @@ class I2CEEPROMFileSystem(LittleFS):
         """
         self.i2c_connected = False
         self.is_mounted = False
+        self.breaker.reset()
         if self._connect_i2c():
             return self._initialize_filesystem(self._block_size, self._block_count)  # 使用默认参数
         return False
 
+    def probe(self) -> bool:
+        """
+        检查设备是否应答
+        :return: I2C已连接且设备应答时为True
+        """
+        if not self.i2c_connected:
+            return False
+        return self.context.buffer.probe()
+
+    def remount(self) -> bool:
+        """
+        设备重新出现后重新挂载，设备内容可能已被修改，缓存随上下文一起丢弃
+        :return: 是否挂载成功
+        """
+        self.is_mounted = False
+        return self._initialize_filesystem(self._block_size, self._block_count)
+
     def get_status(self):
         """
         获取当前状态
-        :return: 包含I2C连接状态和文件系统挂载状态的字典
+        :return: 包含I2C连接状态、文件系统挂载状态和总线可用状态的字典
         """
         return {
             "i2c_connected": self.i2c_connected,
-            "is_mounted": self.is_mounted
+            "is_mounted": self.is_mounted,
+            "bus_available": self.bus_available,
+            "pending_writes": self.write_behind.pending if self.write_behind else 0
         }
 
+    @property
+    def bus_available(self) -> bool:
+        """总线是否可用，断路器断开时为False"""
+        return not self.breaker.is_open
+
     def format(self):
         """
         格式化EEPROM
         """
+        if self.write_behind is not None:
+            self.write_behind.discard()
         try:
             super().format()
             self.mount()
-        except errors.LittleFSError:
+            self.is_mounted = True
+        except LittleFSError:
             print("格式化EEPROM失败")
 
-    def write_file(self, filename: str, content: str):
+    @property
+    def size(self) -> int:
+        """EEPROM总容量(字节)"""
+        return self._block_size * self._block_count
+
+    def dump_image(self, chunk_size: int = None):
+        """
+        顺序读取整个EEPROM镜像
+        :param chunk_size: 每次读取长度，默认使用最大读取长度
+        :return: 生成器，逐段返回镜像数据
+        """
+        self.flush()
+        return self.context.buffer.read_sequential(0, self.size, chunk_size)
+
+    def restore_image(self, data: bytes) -> int:
+        """
+        恢复EEPROM镜像，只写入与当前内容不同的页，完成后重新挂载
+        :param data: 镜像数据，长度必须等于EEPROM容量
+        :return: 实际写入的页数
+        """
+        if len(data) != self.size:
+            raise ValueError(f"镜像大小 {len(data)} 与EEPROM容量 {self.size} 不符")
+        if self.write_behind is not None:
+            self.write_behind.discard()
+        if self.is_mounted:
+            self.unmount()
+            self.is_mounted = False
+        written = self.context.buffer.write_diff(0, data)
+        try:
+            self.mount()
+            self.is_mounted = True
+        except LittleFSError:
+            print("加载EEPROM失败")
+        return written
+
+    def start_trace(self, path: str, snapshot: bool = True):
+        """
+        开始记录总线传输到跟踪文件
+        :param path: 跟踪文件路径
+        :param snapshot: 是否先记录一份设备镜像，回放时作为模拟设备的初始内容
+        """
+        from .trace import RecordingI2C
+        self.stop_trace()
+        recorder = RecordingI2C(self.i2c, path)
+        if snapshot:
+            recorder.snapshot(b''.join(self.dump_image()))
+        self.trace = recorder
+        self.i2c = recorder
+        self.context.buffer.i2c = recorder
+
+    def stop_trace(self):
+        """
+        停止记录总线传输
+        :return: 记录统计，未在记录时返回None
+        """
+        if self.trace is None:
+            return None
+        recorder = self.trace
+        self.trace = None
+        self.i2c = recorder.i2c
+        self.context.buffer.i2c = recorder.i2c
+        return recorder.close()
+
+    def isdir(self, path: str) -> bool:
+        """
+        判断路径是否为已存在的目录
+        :param path: 目录路径，空字符串表示根目录
+        """
+        try:
+            return self.stat(path or "/").type == 2
+        except LittleFSError:
+            return False
+
+    def walk(self, path: str = "", recursive: bool = True, after: str = None):
+        """
+        按路径顺序深度优先遍历目录
+        :param path: 起始目录，空字符串表示根目录
+        :param recursive: 是否递归子目录
+        :param after: 游标，只返回排在该路径之后的条目，之前的子目录整体跳过
+        :return: 生成器，逐个返回 {"path", "name", "type", "size"}，path不带前导"/"
+        """
+        path = path.strip("/")
+        cursor = tuple(after.strip("/").split("/")) if after else None
+        yield from self._walk(path, recursive, cursor)
+
+    def _walk(self, path: str, recursive: bool, cursor: tuple):
+        # 目录项按名称排序，路径的分量元组顺序即遍历顺序
+        for entry in sorted(self.scandir(path or "/"), key=lambda st: st.name):
+            entry_path = f"{path}/{entry.name}" if path else entry.name
+            key = tuple(entry_path.split("/"))
+            is_dir = entry.type == 2
+            if cursor is not None and key <= cursor:
+                # 游标在该目录内部时进入目录继续查找，否则整体跳过
+                if is_dir and recursive and cursor[:len(key)] == key:
+                    yield from self._walk(entry_path, recursive, cursor)
+                continue
+            yield {
+                "path": entry_path,
+                "name": entry.name,
+                "type": "dir" if is_dir else "file",
+                "size": 0 if is_dir else entry.size
+            }
+            if is_dir and recursive:
+                yield from self._walk(entry_path, recursive, None)
+
+    def device_order(self, paths: list) -> list:
+        """
+        按文件数据在设备上的位置排序，批量读取时总线按地址顺序访问
+        元数据无法解析时保持原顺序
+        :param paths: 文件路径列表
+        :return: 排序后的路径列表，找不到的文件排在最后
+        """
+        from .metadata import locate
+        try:
+            locations = locate(self._read_block, paths)
+        except Exception as e:
+            print(f"解析元数据失败: {str(e)}")
+            return list(paths)
+        end = (self._block_count, 0)
+        return sorted(paths, key=lambda p: locations.get(p, end))
+
+    def raw_view(self, offset: int, length: int) -> memoryview:
+        """
+        零拷贝获取设备上的原始数据，先提交暂存的写入
+        :param offset: 起始地址
+        :param length: 长度
+        :return: memoryview，I2C设备引用镜像缓存，镜像文件引用内存映射
+        """
+        if offset < 0 or length <= 0 or offset + length > self.size:
+            raise ValueError(f"区间 {offset}+{length} 超出EEPROM容量 {self.size}")
+        self.flush()
+        return self.context.buffer.view(offset, length)
+
+    def inspect_block(self, block: int) -> dict:
+        """
+        解析块中的LittleFS元数据标签
+        :param block: 块号
+        :return: 字典: block offset size revision metadata tags，数据块的metadata为False
+        """
+        from .metadata import parse_block, describe_tag
+        if not 0 <= block < self._block_count:
+            raise ValueError(f"块号 {block} 超出范围 0-{self._block_count - 1}")
+        offset = block * self._block_size
+        revision, tags = parse_block(self.raw_view(offset, self._block_size))
+        return {
+            "block": block,
+            "offset": offset,
+            "size": self._block_size,
+            "revision": revision,
+            "metadata": any(tag["committed"] for tag in tags),
+            "tags": [describe_tag(tag) for tag in tags],
+        }
+
+    def _read_block(self, block: int) -> bytes:
+        """读取整个块"""
+        return bytes(self.context.buffer[block * self._block_size:(block + 1) * self._block_size])
+
+    def enable_write_behind(self, delay: float = 0.5, lock=None):
+        """
+        启用写回模式，write_file/append_file写入内存暂存区后立即返回，
+        文件停止修改delay秒后由后台线程提交，需要持久化时调用flush
+        :param delay: 提交前等待的时间(秒)，期间同一文件的多次写入合并为一次
+        :param lock: 后台提交时持有的锁，应与调用方访问文件系统的锁相同
+        """
+        from .writebehind import WriteBehind
+        if self.write_behind is None:
+            self.write_behind = WriteBehind(self, delay, lock)
+
+    def flush(self) -> int:
+        """
+        提交写回模式下暂存的全部写入，返回时数据已写入设备
+        :return: 提交的文件数
+        """
+        if self.write_behind is None:
+            return 0
+        return self.write_behind.flush()
+
+    def close_write_behind(self) -> int:
+        """
+        提交暂存的写入并关闭写回模式
+        :return: 提交的文件数
+        """
+        if self.write_behind is None:
+            return 0
+        write_behind = self.write_behind
+        count = write_behind.close()
+        self.write_behind = None
+        return count
+
+    def _fence(self, match):
+        """访问文件前先提交其暂存的写入"""
+        if self.write_behind is not None:
+            self.write_behind.flush(match)
+
+    def open(self, fname: str, mode="r", *args, **kwargs):
+        key = fname.strip("/")
+        self._fence(lambda name: name == key)
+        fh = super().open(fname, mode, *args, **kwargs)
+        raw = getattr(getattr(fh, "buffer", fh), "raw", fh)
+        if type(raw) is FileHandle:
+            raw.__class__ = SafeFileHandle
+        return fh
+
+    def stat(self, path: str):
+        key = path.strip("/")
+        self._fence(lambda name: name == key)
+        return super().stat(path)
+
+    def scandir(self, path="."):
+        # 不提交暂存的写入，把暂存区中该目录下的文件合并到结果中，大小为暂存写入后的大小
+        if self.write_behind is None:
+            yield from super().scandir(path)
+            return
+        key = "" if path.strip("/") == "." else path.strip("/")
+        staged = self.write_behind.staged(lambda name: name.rpartition("/")[0] == key)
+        for entry in super().scandir(path):
+            name = f"{key}/{entry.name}" if key else entry.name
+            if entry.type == 1 and name in staged:
+                entry = LFSStat(entry.type, staged.pop(name), entry.name)
+            yield entry
+        for name, size in sorted(staged.items()):
+            yield LFSStat(1, size, name.rpartition("/")[2])
+
+    def remove(self, path: str, recursive: bool = False):
+        key = path.strip("/")
+        self._fence(lambda name: name == key or name.startswith(key + "/"))
+        return super().remove(path, recursive)
+
+    def rename(self, src: str, dst: str):
+        keys = (src.strip("/"), dst.strip("/"))
+        self._fence(lambda name: any(name == key or name.startswith(key + "/") for key in keys))
+        return super().rename(src, dst)
+
+    def write_file(self, filename: str, content: str) -> int:
         """
         写入文件
         :param filename: 文件名
         :param content: 文件内容
+        :return: 文件大小
+        """
+        if self.write_behind is not None:
+            self._check_parent(filename)
+            return self.write_behind.write(filename, content)
+        return self._commit_write(filename, content)
+
+    def _check_parent(self, filename: str):
+        """
+        暂存前检查父目录，避免暂存的写入在后台提交时才失败
+        :raises FileNotFoundError: 父目录不存在或不是目录
         """
+        parent = filename.strip("/").rpartition("/")[0]
+        if not parent:
+            return
+        try:
+            is_dir = self.stat(parent).type == 2
+        except LittleFSError:
+            is_dir = False
+        if not is_dir:
+            raise FileNotFoundError(f"目录 {parent} 不存在")
+
+    def _commit_write(self, filename: str, content: str) -> int:
         with self.open(filename, 'w') as fh:
             fh.write(content)
-    
+        return len(content.encode("utf-8"))
+
+    def append_file(self, filename: str, content: str) -> int:
+        """
+        追加内容到文件末尾，只写入新增的数据，文件不存在时创建
+        :param filename: 文件名
+        :param content: 追加的内容
+        :return: 追加后的文件大小
+        """
+        if self.write_behind is not None:
+            self._check_parent(filename)
+            return self.write_behind.append(filename, content, lambda: self._file_size(filename))
+        return self._commit_append(filename, content)
+
+    def _file_size(self, filename: str) -> int:
+        try:
+            return self.stat(filename).size
+        except LittleFSError:
+            return 0
+
+    def _commit_append(self, filename: str, content: str) -> int:
+        try:
+            fh = self.open(filename, 'a')
+        except FileNotFoundError:
+            # littlefs-python的追加模式不会创建文件
+            fh = self.open(filename, 'w')
+        with fh:
+            fh.write(content)
+        return self.stat(filename).size
+
+    def write_at(self, filename: str, offset: int, content: str) -> int:
+        """
+        从指定字节偏移处覆盖写入，不截断文件，偏移超过文件末尾时中间补0，文件不存在时创建
+        LittleFS写时复制，偏移所在块之后的数据会被重写，越靠近文件末尾代价越小
+        :param filename: 文件名
+        :param offset: 字节偏移
+        :param content: 写入的内容，按UTF-8编码
+        :return: 写入后的文件大小
+        """
+        if offset < 0:
+            raise ValueError(f"偏移 {offset} 不能为负数")
+        try:
+            fh = self.open(filename, 'r+b')
+        except FileNotFoundError:
+            fh = self.open(filename, 'wb')
+        with fh:
+            fh.seek(offset)
+            fh.write(content.encode("utf-8"))
+        return self.stat(filename).size
+
+    @property
+    def kv(self):
+        """键值存储"""
+        if self._kv is None:
+            from .kvstore import KVStore
+            self._kv = KVStore(self)
+        return self._kv
+
+    def kv_get(self, key: str) -> str:
+        """
+        读取键值，日志文件未被其他操作修改时只查询内存索引
+        :raises KeyError: 键不存在
+        """
+        return self.kv.get(key)
+
+    def kv_put(self, key: str, value: str):
+        """写入键值，在日志末尾追加一条记录"""
+        self.kv.put(key, value)
+
+    def kv_put_many(self, items: dict):
+        """写入多个键值，所有记录一次追加"""
+        self.kv.put_many(items)
+
+    def kv_delete(self, key: str):
+        """
+        删除键
+        :raises KeyError: 键不存在
+        """
+        self.kv.delete(key)
+
+    def kv_scan(self, prefix: str = "", after: str = None, limit: int = None) -> list:
+        """
+        按键排序遍历
+        :return: [(键, 值)]
+        """
+        return self.kv.scan(prefix, after, limit)
+
     def read_file(self, filename: str) -> str:
         """
         读取文件内容
         :param filename: 文件名
         :return: 文件内容
         """
+        if self.write_behind is not None:
+            content = self.write_behind.read(filename)
+            if content is not None:
+                return content
         with self.open(filename, 'r') as fh:
             return fh.read()
 
+    def used_blocks(self) -> int:
+        """已用块数，需要遍历整个文件系统，设备内容未变化时直接返回上次的结果"""
+        generation = self.context.buffer.generation
+        if self._used_blocks is None or self._used_blocks[0] != generation:
+            self._used_blocks = (generation, self.used_block_count)
+        return self._used_blocks[1]
+
+    def maintenance_steps(self):
+        """
+        空闲维护，每次迭代只执行一步，调用方可以在任意两步之间停止迭代
+        gc: 压缩超过阈值的元数据块对并预先扫描空闲块，之后的写入不必在请求中压缩
+        prewarm: 把一个块读入设备镜像缓存，之后的读取不再访问总线
+        kv_compact: 压缩键值存储的日志
+        storage: 重新统计已用块数
+        :return: 生成器，每完成一步返回步骤名
+        """
+        if not self.is_mounted:
+            return
+        buffer = self.context.buffer
+        if self._gc_generation != buffer.generation:
+            self.fs_gc()
+            self._gc_generation = buffer.generation
+            yield "gc"
+        if getattr(buffer, "cache", None) is not None:
+            for block in range(self._block_count):
+                start = block * self._block_size
+                if not buffer.is_cached(start, self._block_size):
+                    buffer.view(start, self._block_size)
+                    yield "prewarm"
+        if self._kv is not None and self._kv.needs_compaction():
+            self._kv.compact()
+            yield "kv_compact"
+        if self._used_blocks is None or self._used_blocks[0] != buffer.generation:
+            self.used_blocks()
+            yield "storage"
+
     def get_storage_info(self):
         """
         获取存储信息
@@ -154,7 +787,8 @@ class I2CEEPROMFileSystem(LittleFS):
         try:
             # 使用LittleFS底层属性获取存储信息
             total = self.block_count * self._block_size 
-            used = self.used_block_count * self._block_size
+            used_blocks = self.used_blocks()
+            used = used_blocks * self._block_size
             free = total - used
             
             return {
@@ -163,7 +797,7 @@ class I2CEEPROMFileSystem(LittleFS):
                 "free": free,
                 "block_size": self._block_size,
                 "block_count": self.block_count,
-                "used_blocks": self.used_block_count
+                "used_blocks": used_blocks
             }
         except Exception as e:
             print(f"获取存储信息失败: {str(e)}")
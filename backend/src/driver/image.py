@@ -0,0 +1,151 @@
+from littlefs import UserContext
+from .eeprom import I2CEEPROMFileSystem
+import mmap
+import os
+
+class ImageBuffer:
+    """内存映射本地镜像文件的缓冲区，接口与EEPROMBuffer一致"""
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        self._file = open(path, "r+b" if writable else "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"镜像文件 {path} 为空")
+        self._view = memoryview(self._mmap)
+        self.generation = 0  # 写入计数，与EEPROMBuffer一致
+
+    def __len__(self):
+        return len(self._mmap)
+
+    def __getitem__(self, addr: slice) -> bytes:
+        # LittleFS回调要求返回bytes，直接从映射中切片
+        return self._mmap[addr.start:addr.stop]
+
+    def __setitem__(self, addr: slice, value: list | bytes):
+        if not self.writable:
+            raise PermissionError(f"镜像文件 {self.path} 以只读方式打开")
+        start = addr.start
+        self._mmap[start:start + len(value)] = bytes(value)
+        self.generation += 1
+
+    def view(self, start: int, size: int) -> memoryview:
+        """
+        零拷贝获取镜像数据
+        :param start: 起始地址
+        :param size: 长度
+        :return: 映射区域的memoryview
+        """
+        return self._view[start:start + size]
+
+    def read_sequential(self, start: int, size: int, chunk_size: int = None):
+        """
+        分段顺序读取，直接返回映射区域的memoryview
+        :param start: 起始地址
+        :param size: 读取长度
+        :param chunk_size: 每段长度，默认一次返回全部
+        :return: 生成器，逐段返回读取的数据
+        """
+        chunk_size = chunk_size or size
+        end = start + size
+        for offset in range(start, end, chunk_size):
+            yield self.view(offset, min(chunk_size, end - offset))
+
+    def write_diff(self, start: int, data: bytes) -> int:
+        """
+        写入数据，镜像文件没有页的概念，按整体比较
+        :return: 实际写入的字节数
+        """
+        if self.view(start, len(data)) == data:
+            return 0
+        self[start:start + len(data)] = data
+        return len(data)
+
+    def probe(self) -> bool:
+        """镜像文件始终可用"""
+        return True
+
+    def flush(self):
+        """将修改同步到镜像文件"""
+        if self.writable:
+            self._mmap.flush()
+
+    def close(self):
+        """关闭镜像文件"""
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+
+class ImageContext(UserContext):
+    """镜像文件用户上下文"""
+    def __init__(self, image: ImageBuffer):
+        self.buffer = image
+
+    def sync(self, cfg) -> int:
+        self.buffer.flush()
+        return 0
+
+
+class ImageEEPROMFileSystem(I2CEEPROMFileSystem):
+    """基于本地镜像文件的EEPROM文件系统，用于离线查看设备转储"""
+
+    def __init__(self, image: str | ImageBuffer, block_size=512, writable: bool = False):
+        """
+        打开镜像文件
+        :param image: 镜像文件路径或已打开的ImageBuffer
+        :param block_size: 块大小
+        :param writable: 是否允许写入镜像文件
+        """
+        self.image = image if isinstance(image, ImageBuffer) else ImageBuffer(image, writable)
+        block_count = len(self.image) // block_size
+        if block_count == 0:
+            raise ValueError(f"镜像文件 {self.image.path} 小于一个块")
+        super().__init__(block_size=block_size, block_count=block_count)
+
+    def _connect_i2c(self):
+        """镜像文件已打开，视为设备已连接"""
+        self.i2c_connected = True
+        return True
+
+    def _create_context(self):
+        return ImageContext(self.image)
+
+    def get_status(self):
+        status = super().get_status()
+        status["image"] = os.path.abspath(self.image.path)
+        return status
+
+    def _check_writable(self):
+        if not self.image.writable:
+            raise PermissionError(f"镜像文件 {self.image.path} 以只读方式打开")
+
+    def open(self, fname: str, mode="r", *args, **kwargs):
+        if any(ch in mode for ch in "wax+"):
+            self._check_writable()
+        return super().open(fname, mode, *args, **kwargs)
+
+    def remove(self, path: str, recursive: bool = False) -> None:
+        self._check_writable()
+        return super().remove(path, recursive)
+
+    def rename(self, src: str, dst: str) -> int:
+        self._check_writable()
+        return super().rename(src, dst)
+
+    def mkdir(self, path: str) -> int:
+        self._check_writable()
+        return super().mkdir(path)
+
+    def format(self):
+        self._check_writable()
+        return super().format()
+
+    def restore_image(self, data: bytes) -> int:
+        self._check_writable()
+        return super().restore_image(data)
+
+    def start_trace(self, path: str, snapshot: bool = True):
+        raise ValueError("离线镜像没有总线传输可记录")
@@ -0,0 +1,220 @@
+import struct
+import zlib
+from littlefs import LittleFSError
+
+# 键值记录存储
+# 所有记录追加到同一个日志文件，内存中的索引保存每个键的最新值，读取不访问设备
+# 文件格式: 文件头MAGIC，之后为连续的记录
+# 记录: 操作(1) 键长度(1) 值长度(2) CRC32(4) 键 值，CRC覆盖前4字节、键和值
+# 删除记录的值为空；CRC不符的记录及其之后的内容视为无效，下次写入前压缩掉
+
+MAGIC = b"KVS1"
+OP_PUT = 1
+OP_DELETE = 2
+HEADER = struct.Struct("<BBHI")
+MAX_KEY = 0xff
+MAX_VALUE = 0xffff
+
+
+def encode_record(op: int, key: bytes, value: bytes = b"") -> bytes:
+    head = struct.pack("<BBH", op, len(key), len(value))
+    crc = zlib.crc32(value, zlib.crc32(key, zlib.crc32(head)))
+    return head + struct.pack("<I", crc) + key + value
+
+
+def decode_records(data: bytes, offset: int = len(MAGIC)):
+    """
+    按顺序解析记录
+    :return: 生成器，返回(操作, 键, 值, 记录结束偏移)，遇到无效记录时停止
+    """
+    while offset + HEADER.size <= len(data):
+        op, key_len, value_len, crc = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + key_len + value_len
+        if op not in (OP_PUT, OP_DELETE) or end > len(data):
+            return
+        key = data[offset + HEADER.size:offset + HEADER.size + key_len]
+        value = data[offset + HEADER.size + key_len:end]
+        if zlib.crc32(value, zlib.crc32(key, zlib.crc32(data[offset:offset + 4]))) != crc:
+            return
+        yield op, key, value, end
+        offset = end
+
+
+class KVStore:
+    """
+    日志结构的键值存储
+    写入和删除只在日志文件末尾追加一条记录，挂载后首次使用时读取整个日志重建索引；
+    日志中失效的记录超过一定比例后重写为只包含当前值的新日志
+    """
+
+    def __init__(self, fs, path: str = ".kvstore", compact_ratio: float = 2.0, compact_min: int = 1024):
+        """
+        :param fs: 文件系统实例
+        :param path: 日志文件路径
+        :param compact_ratio: 日志大小超过有效记录大小的倍数后需要压缩
+        :param compact_min: 日志小于该大小(字节)时不压缩
+        """
+        self.fs = fs
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._index = {}  # 键 -> 值
+        self._size = 0  # 日志文件大小
+        self._live = len(MAGIC)  # 有效记录的总大小
+        self._valid = True  # 日志末尾没有无效记录
+        self.load()
+
+    def load(self):
+        """读取日志重建索引"""
+        self._index = {}
+        try:
+            with self.fs.open(self.path, "rb") as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            data = b""
+        self._size = len(data)
+        self._valid = True
+        if not data:
+            self._live = len(MAGIC)
+            return
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{self.path} 不是键值存储文件")
+        end = len(MAGIC)
+        for op, key, value, end in decode_records(data):
+            if op == OP_PUT:
+                self._index[key.decode("utf-8")] = value.decode("utf-8")
+            else:
+                self._index.pop(key.decode("utf-8"), None)
+        self._valid = end == len(data)
+        self._live = len(MAGIC) + sum(self._record_size(k, v) for k, v in self._index.items())
+
+    @staticmethod
+    def _record_size(key: str, value: str) -> int:
+        return HEADER.size + len(key.encode("utf-8")) + len(value.encode("utf-8"))
+
+    def __len__(self):
+        self._check()
+        return len(self._index)
+
+    def __contains__(self, key: str):
+        self._check()
+        return key in self._index
+
+    def get(self, key: str) -> str:
+        """
+        读取键的值，日志文件未被其他操作修改时只查询内存索引
+        :raises KeyError: 键不存在
+        """
+        self._check()
+        return self._index[key]
+
+    def put(self, key: str, value: str):
+        """写入键值，追加一条记录"""
+        self.put_many({key: value})
+
+    def put_many(self, items: dict):
+        """
+        写入多个键值，所有记录一次追加，比逐个写入少复制文件末尾的块
+        :param items: {键: 值}
+        """
+        records = b"".join(encode_record(OP_PUT, *self._encode(k, v)) for k, v in items.items())
+        if not records:
+            return
+        self._check()
+        self._append(records)
+        for key, value in items.items():
+            if key in self._index:
+                self._live -= self._record_size(key, self._index[key])
+            self._index[key] = value
+            self._live += self._record_size(key, value)
+        self._limit()
+
+    def delete(self, key: str):
+        """
+        删除键，追加一条删除记录
+        :raises KeyError: 键不存在
+        """
+        self._check()
+        value = self._index[key]
+        self._append(encode_record(OP_DELETE, key.encode("utf-8")))
+        del self._index[key]
+        self._live -= self._record_size(key, value)
+        self._limit()
+
+    def scan(self, prefix: str = "", after: str = None, limit: int = None):
+        """
+        按键排序遍历
+        :param prefix: 键前缀
+        :param after: 从该键之后开始，用于分页
+        :param limit: 最多返回的条数
+        :return: [(键, 值)]
+        """
+        self._check()
+        keys = sorted(k for k in self._index if k.startswith(prefix) and (after is None or k > after))
+        if limit is not None:
+            keys = keys[:limit]
+        return [(k, self._index[k]) for k in keys]
+
+    @staticmethod
+    def _encode(key: str, value: str):
+        key_bytes = key.encode("utf-8")
+        value_bytes = value.encode("utf-8")
+        if not key_bytes or len(key_bytes) > MAX_KEY:
+            raise ValueError(f"键的长度必须在1-{MAX_KEY}字节之间")
+        if len(value_bytes) > MAX_VALUE:
+            raise ValueError(f"值的长度不能超过{MAX_VALUE}字节")
+        return key_bytes, value_bytes
+
+    def _check(self):
+        """日志文件被其他操作修改或删除时重新加载"""
+        try:
+            size = self.fs.stat(self.path).size
+        except LittleFSError:
+            size = 0
+        if size != self._size:
+            self.load()
+
+    def _append(self, record: bytes):
+        if not self._valid:
+            self.compact()  # 先去掉末尾的无效记录，否则追加的记录无法读取
+        if self._size == 0:
+            with self.fs.open(self.path, "wb") as fh:
+                fh.write(MAGIC + record)
+            self._size = len(MAGIC) + len(record)
+            return
+        with self.fs.open(self.path, "ab") as fh:
+            fh.write(record)
+        self._size += len(record)
+
+    def _limit(self):
+        """压缩一般在空闲维护中进行，失效记录达到两倍比例时在写入中直接压缩，限制日志增长"""
+        if self.needs_compaction(self.compact_ratio * 2):
+            self.compact()
+
+    def needs_compaction(self, ratio: float = None) -> bool:
+        """失效记录是否已超过比例"""
+        ratio = ratio or self.compact_ratio
+        return not self._valid or (self._size > self.compact_min and self._size > self._live * ratio)
+
+    def compact(self) -> int:
+        """
+        把当前值写入新日志再替换旧日志，重命名是原子操作，中途掉电时旧日志仍然完整
+        :return: 释放的字节数
+        """
+        data = MAGIC + b"".join(encode_record(OP_PUT, *self._encode(k, v)) for k, v in sorted(self._index.items()))
+        temp = self.path + ".tmp"
+        with self.fs.open(temp, "wb") as fh:
+            fh.write(data)
+        self.fs.rename(temp, self.path)
+        freed = self._size - len(data)
+        self._size = self._live = len(data)
+        self._valid = True
+        return freed
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "keys": len(self._index),
+            "log_size": self._size,
+            "live_size": self._live,
+        }
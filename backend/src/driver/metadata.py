@@ -0,0 +1,273 @@
+import struct
+import zlib
+
+# LittleFS元数据标签解析
+# 标签为32位大端整数，与前一个标签异或存储: 有效位(1) 类型(11) id(10) 长度(10)
+# 参考 https://github.com/littlefs-project/littlefs/blob/master/SPEC.md
+
+TYPE_NAME = 0x000
+TYPE_REG = 0x001
+TYPE_DIR = 0x002
+TYPE_SUPERBLOCK = 0x0ff
+TYPE_STRUCT = 0x200
+TYPE_DIRSTRUCT = 0x200
+TYPE_INLINESTRUCT = 0x201
+TYPE_CTZSTRUCT = 0x202
+TYPE_USERATTR = 0x300
+TYPE_SPLICE = 0x400
+TYPE_CREATE = 0x401
+TYPE_DELETE = 0x4ff
+TYPE_CRC = 0x500
+TYPE_FCRC = 0x5ff
+TYPE_TAIL = 0x600
+TYPE_SOFTTAIL = 0x600
+TYPE_HARDTAIL = 0x601
+TYPE_GLOBALS = 0x700
+TYPE_MOVESTATE = 0x7ff
+
+TYPE_NAMES = {
+    TYPE_REG: "reg",
+    TYPE_DIR: "dir",
+    TYPE_SUPERBLOCK: "superblock",
+    TYPE_DIRSTRUCT: "dirstruct",
+    TYPE_INLINESTRUCT: "inlinestruct",
+    TYPE_CTZSTRUCT: "ctzstruct",
+    TYPE_CREATE: "create",
+    TYPE_DELETE: "delete",
+    TYPE_FCRC: "fcrc",
+    TYPE_SOFTTAIL: "softtail",
+    TYPE_HARDTAIL: "hardtail",
+    TYPE_MOVESTATE: "movestate",
+}
+
+ROOT_PAIR = (0, 1)
+
+
+def type_name(type3: int) -> str:
+    """标签类型的可读名称"""
+    if type3 in TYPE_NAMES:
+        return TYPE_NAMES[type3]
+    if type3 & 0x780 == TYPE_CRC:
+        return "crc"
+    if type3 & 0x700 == TYPE_USERATTR:
+        return f"userattr{type3 & 0xff:#04x}"
+    return f"{type3:#05x}"
+
+
+def parse_block(data: bytes):
+    """
+    按提交顺序解析元数据块中的标签，并校验每次提交的CRC
+    :param data: 整个块的数据
+    :return: (修订号, 标签列表)，标签为字典: offset type id size data committed
+    """
+    revision = struct.unpack_from("<I", data, 0)[0]
+    tags = []
+    pending = []
+    off = 4
+    ptag = 0xffffffff
+    crc = zlib.crc32(data[:4])
+    while off + 4 <= len(data):
+        raw = data[off:off + 4]
+        tag = struct.unpack(">I", raw)[0] ^ ptag
+        if tag & 0x80000000:
+            break  # 未写入的区域
+        type3 = (tag >> 20) & 0x7ff
+        tag_id = (tag >> 10) & 0x3ff
+        size = tag & 0x3ff
+        dsize = 4 + (0 if size == 0x3ff else size)
+        if off + dsize > len(data):
+            break
+        crc = zlib.crc32(raw, crc)
+        ptag = tag
+        entry = {"offset": off, "type": type3, "id": tag_id, "size": size,
+                 "data": data[off + 4:off + dsize], "committed": False}
+
+        if type3 & 0x780 == TYPE_CRC:
+            # LittleFS的CRC初值为0xffffffff且不取反
+            valid = (crc ^ 0xffffffff) == struct.unpack_from("<I", data, off + 4)[0]
+            for pending_tag in pending + [entry]:
+                pending_tag["committed"] = valid
+            tags += pending + [entry]
+            pending = []
+            if not valid:
+                return revision, tags
+            ptag ^= (type3 & 1) << 31
+            crc = 0
+            off += dsize
+            continue
+
+        crc = zlib.crc32(entry["data"], crc)
+        pending.append(entry)
+        off += dsize
+    return revision, tags + pending
+
+
+def describe_tag(tag) -> dict:
+    """
+    转换为可序列化的标签描述，按类型解码标签数据
+    :return: 字典: offset type name id size committed value
+    """
+    type3 = tag["type"]
+    data = bytes(tag["data"])
+    if type3 & 0x700 == TYPE_NAME:
+        value = data.decode("utf-8", "replace")
+    elif type3 in (TYPE_DIRSTRUCT, TYPE_SOFTTAIL, TYPE_HARDTAIL) and len(data) >= 8:
+        value = "pair %d,%d" % struct.unpack("<II", data[:8])
+    elif type3 == TYPE_CTZSTRUCT and len(data) >= 8:
+        value = "head %d size %d" % struct.unpack("<II", data[:8])
+    elif type3 & 0x780 == TYPE_CRC and len(data) >= 4:
+        value = f"{struct.unpack_from('<I', data)[0]:#010x}"
+    else:
+        value = data[:32].hex() + ("..." if len(data) > 32 else "")
+    return {
+        "offset": tag["offset"],
+        "type": type3,
+        "name": type_name(type3),
+        "id": tag["id"],
+        "size": tag["size"],
+        "committed": tag["committed"],
+        "value": value,
+    }
+
+
+def replay_tags(tags):
+    """
+    重放已提交的标签，得到元数据块中的目录项
+    :return: (目录项列表, 尾指针)，目录项下标即id，尾指针为(类型, 块对)或None
+    """
+    entries = []
+    tail = None
+
+    def at(tag_id):
+        while len(entries) <= tag_id:
+            entries.append({})
+        return entries[tag_id]
+
+    for tag in tags:
+        if not tag["committed"]:
+            break
+        type3 = tag["type"]
+        kind = type3 & 0x700
+        if type3 == TYPE_CREATE:
+            entries.insert(tag["id"], {})
+        elif type3 == TYPE_DELETE:
+            if tag["id"] < len(entries):
+                del entries[tag["id"]]
+        elif kind == TYPE_NAME:
+            at(tag["id"]).update(name=tag["data"].decode("utf-8", "replace"), type=type3)
+        elif kind == TYPE_STRUCT:
+            at(tag["id"]).update(struct=type3, struct_data=tag["data"], struct_offset=tag["offset"])
+        elif kind == TYPE_TAIL:
+            tail = (type3, struct.unpack("<II", tag["data"][:8]))
+    return entries, tail
+
+
+def fetch_pair(read_block, pair):
+    """
+    读取元数据块对中较新的有效块
+    :param read_block: 读取整个块的函数
+    :return: (块号, 标签列表)
+    """
+    candidates = []
+    for block in pair:
+        revision, tags = parse_block(read_block(block))
+        if any(tag["committed"] for tag in tags):
+            candidates.append((revision, block, tags))
+    if not candidates:
+        raise ValueError(f"元数据块对 {pair} 中没有有效提交")
+    if len(candidates) == 2:
+        # 修订号按有符号差比较，允许回绕
+        (rev_a, _, _), (rev_b, _, _) = candidates
+        if ((rev_b - rev_a) & 0xffffffff) < 0x80000000 and rev_b != rev_a:
+            candidates.reverse()
+    _, block, tags = candidates[0]
+    return block, tags
+
+
+def read_dir(read_block, pair=ROOT_PAIR):
+    """
+    读取目录的所有目录项，沿硬尾指针读取拆分到多个块对的目录
+    :return: 目录项列表，每项附带所在的元数据块号block
+    """
+    result = []
+    seen = set()
+    while pair and tuple(pair) not in seen:
+        seen.add(tuple(pair))
+        block, tags = fetch_pair(read_block, pair)
+        entries, tail = replay_tags(tags)
+        for entry in entries:
+            if "name" in entry and entry["type"] in (TYPE_REG, TYPE_DIR):
+                result.append(dict(entry, block=block))
+        pair = tail[1] if tail and tail[0] == TYPE_HARDTAIL else None
+    return result
+
+
+def ctz_index(block_size: int, size: int) -> int:
+    """
+    CTZ链表中最后一个块的序号，与LittleFS的lfs_ctz_index相同
+    每个块开头保存指向之前块的指针，第n块有 ctz(n)+1 个指针
+    """
+    b = block_size - 2 * 4
+    i = (size - 1) // b
+    if i == 0:
+        return 0
+    return (size - 1 - 4 * (bin(i - 1).count("1") + 2)) // b
+
+
+def ctz_first_block(read_block, head: int, size: int) -> int:
+    """
+    沿CTZ跳表从链表头(最后一块)找到第一个数据块，需要读取约log2(块数)个块
+    :param read_block: 读取整个块的函数
+    :param head: 链表头块号
+    :param size: 文件大小
+    :return: 第一个数据块的块号
+    """
+    if size == 0:
+        return head
+    block = head
+    data = read_block(block)
+    current = ctz_index(len(data), size)
+    while current > 0:
+        # 跳过最大的2的幂，不超过当前序号的末尾零位数
+        skip = min(current.bit_length() - 1, (current & -current).bit_length() - 1)
+        block = struct.unpack_from("<I", data, 4 * skip)[0]
+        current -= 1 << skip
+        if current > 0:
+            data = read_block(block)
+    return block
+
+
+def locate(read_block, paths):
+    """
+    查找文件数据在设备上的位置
+    :param read_block: 读取整个块的函数
+    :param paths: 文件路径列表
+    :return: {路径: (块号, 偏移)}，内联文件为所在元数据块和结构标签偏移，其余为CTZ链表的第一个数据块
+    """
+    dirs = {}
+    locations = {}
+
+    def entries_of(dir_path):
+        if dir_path not in dirs:
+            if not dir_path:
+                dirs[dir_path] = read_dir(read_block, ROOT_PAIR)
+            else:
+                parent, _, name = dir_path.rpartition("/")
+                entry = next((e for e in entries_of(parent) if e["name"] == name and e["type"] == TYPE_DIR), None)
+                if entry is None or entry.get("struct") != TYPE_DIRSTRUCT:
+                    dirs[dir_path] = []
+                else:
+                    dirs[dir_path] = read_dir(read_block, struct.unpack("<II", entry["struct_data"][:8]))
+        return dirs[dir_path]
+
+    for path in paths:
+        dir_path, _, name = path.strip("/").rpartition("/")
+        entry = next((e for e in entries_of(dir_path) if e["name"] == name), None)
+        if entry is None or "struct" not in entry:
+            continue
+        if entry["struct"] == TYPE_CTZSTRUCT:
+            head, size = struct.unpack("<II", entry["struct_data"][:8])
+            locations[path] = (ctz_first_block(read_block, head, size), 0)
+        else:
+            locations[path] = (entry["block"], entry["struct_offset"])
+    return locations
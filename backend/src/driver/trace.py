@@ -0,0 +1,292 @@
+from collections import Counter, namedtuple
+from i2cpy import errors
+import random
+import struct
+import threading
+import time
+
+# 跟踪文件格式:
+#   文件头: 魔数 b"I2CT", 版本号, 开始记录时的时间戳
+#   记录:   操作标志, 设备地址, 地址位数, 内存地址, 长度, 相对开始时间(秒), 耗时(秒)，
+#           带数据标志时后跟length字节数据
+MAGIC = b"I2CT"
+VERSION = 1
+HEADER = struct.Struct("<4sBd")
+RECORD = struct.Struct("<BBBIIdf")
+
+OP_READ = 0
+OP_WRITE = 1
+OP_SNAPSHOT = 2
+OP_MASK = 0x0F
+FLAG_DATA = 0x10
+FLAG_ERROR = 0x20
+
+TraceRecord = namedtuple("TraceRecord", "op addr addrsize memaddr length t duration data error")
+
+
+class RecordingI2C:
+    """记录readfrom_mem/writeto_mem传输的I2C包装，其余接口直接转发"""
+
+    def __init__(self, i2c, path: str, record_data: bool = True):
+        """
+        :param i2c: 被包装的I2C实例
+        :param path: 跟踪文件路径
+        :param record_data: 是否记录读取到的数据，回放时用于校验
+        """
+        self.i2c = i2c
+        self.path = path
+        self.record_data = record_data
+        self.count = 0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+
+    def __getattr__(self, name):
+        return getattr(self.i2c, name)
+
+    def _record(self, op: int, addr: int, addrsize: int, memaddr: int, length: int,
+                start: float, data: bytes = None, error: bool = False):
+        flags = op
+        if data is not None:
+            flags |= FLAG_DATA
+        if error:
+            flags |= FLAG_ERROR
+        header = RECORD.pack(flags, addr, addrsize, memaddr, length,
+                             start - self._start, time.perf_counter() - start)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(header)
+            if data is not None:
+                self._file.write(data)
+            self.count += 1
+
+    def snapshot(self, image: bytes):
+        """记录设备镜像，作为回放的初始内容"""
+        self._record(OP_SNAPSHOT, 0, 0, 0, len(image), time.perf_counter(), bytes(image))
+
+    def readfrom_mem(self, addr: int, memaddr: int, nbytes: int, *, addrsize: int = 8) -> bytes:
+        start = time.perf_counter()
+        try:
+            data = self.i2c.readfrom_mem(addr, memaddr, nbytes, addrsize=addrsize)
+        except Exception:
+            self._record(OP_READ, addr, addrsize, memaddr, nbytes, start, error=True)
+            raise
+        self._record(OP_READ, addr, addrsize, memaddr, nbytes, start, data if self.record_data else None)
+        return data
+
+    def writeto_mem(self, addr: int, memaddr: int, buf, *, addrsize: int = 8):
+        start = time.perf_counter()
+        try:
+            result = self.i2c.writeto_mem(addr, memaddr, buf, addrsize=addrsize)
+        except Exception:
+            self._record(OP_WRITE, addr, addrsize, memaddr, len(buf), start, bytes(buf), error=True)
+            raise
+        self._record(OP_WRITE, addr, addrsize, memaddr, len(buf), start, bytes(buf))
+        return result
+
+    def close(self):
+        """
+        结束记录
+        :return: 记录统计
+        """
+        with self._lock:
+            self._file.close()
+        return {
+            "path": self.path,
+            "transactions": self.count,
+            "duration": round(time.perf_counter() - self._start, 3)
+        }
+
+
+def read_trace(path: str):
+    """
+    读取跟踪文件
+    :return: 生成器，逐条返回TraceRecord
+    """
+    with open(path, "rb") as fh:
+        magic, version, _ = HEADER.unpack(fh.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是有效的跟踪文件")
+        while True:
+            header = fh.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            flags, addr, addrsize, memaddr, length, t, duration = RECORD.unpack(header)
+            data = fh.read(length) if flags & FLAG_DATA else None
+            yield TraceRecord(flags & OP_MASK, addr, addrsize, memaddr, length, t, duration,
+                              data, bool(flags & FLAG_ERROR))
+
+
+class SimulatedEEPROM:
+    """
+    内存中的模拟EEPROM，接口与i2cpy.I2C一致
+    页写入超过页边界时回绕到页首，与真实器件行为相同
+    """
+
+    def __init__(self, size: int = 32768, page_size: int = 64, eeprom_addr: int = 0x50, image: bytes = None,
+                 bus_khz: float = None, nack_rate: float = 0.0):
+        """
+        :param bus_khz: 模拟的总线时钟(kHz)，按传输字节数等待相应时间，默认不等待
+        :param nack_rate: 随机无应答的概率，用于测试重试和断路器
+        """
+        self.size = size
+        self.page_size = page_size
+        self.eeprom_addr = eeprom_addr
+        self.memory = bytearray(image) if image is not None else bytearray(b"\xff" * size)
+        self.bus_khz = bus_khz
+        self.nack_rate = nack_rate
+        self.reads = 0
+        self.writes = 0
+
+    def _check_addr(self, addr: int, operation: str):
+        if addr != self.eeprom_addr:
+            raise errors.I2COperationFailedError(operation, f"设备 {addr:#x} 无应答")
+        if self.nack_rate and random.random() < self.nack_rate:
+            raise errors.I2COperationFailedError(operation, "模拟的随机无应答")
+
+    def _bus_time(self, nbytes: int):
+        """每字节9个时钟周期，nbytes包括设备地址和内存地址"""
+        if self.bus_khz:
+            time.sleep(nbytes * 9 / (self.bus_khz * 1000))
+
+    def readfrom_mem(self, addr: int, memaddr: int, nbytes: int, *, addrsize: int = 8) -> bytes:
+        self._check_addr(addr, "readfrom_mem")
+        self.reads += 1
+        self._bus_time(nbytes + 2 + addrsize // 8)
+        memaddr %= self.size
+        data = self.memory[memaddr:memaddr + nbytes]
+        # 顺序读取超过末尾时回绕到地址0
+        while len(data) < nbytes:
+            data += self.memory[:nbytes - len(data)]
+        return bytes(data)
+
+    def writeto_mem(self, addr: int, memaddr: int, buf, *, addrsize: int = 8):
+        self._check_addr(addr, "writeto_mem")
+        self.writes += 1
+        self._bus_time(len(buf) + 1 + addrsize // 8)
+        page_start = memaddr - memaddr % self.page_size
+        for i, value in enumerate(bytes(buf)):
+            offset = (memaddr - page_start + i) % self.page_size
+            self.memory[(page_start + offset) % self.size] = value
+
+
+def replay(records, device=None, realtime: bool = False):
+    """
+    在模拟设备上回放跟踪记录
+    :param records: TraceRecord序列
+    :param device: 回放使用的设备，默认根据镜像记录创建SimulatedEEPROM
+    :param realtime: 是否按记录的时间间隔回放
+    :return: 回放结果，包含与记录不一致的读取
+    """
+    result = {"transactions": 0, "reads": 0, "writes": 0, "mismatches": [], "errors": 0}
+    start = time.perf_counter()
+    for index, record in enumerate(records):
+        if record.op == OP_SNAPSHOT:
+            if device is None:
+                device = SimulatedEEPROM(size=record.length, image=record.data)
+            continue
+        if device is None:
+            device = SimulatedEEPROM()
+        if record.error:
+            result["errors"] += 1
+            continue
+        if realtime:
+            delay = record.t - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        result["transactions"] += 1
+        if record.op == OP_READ:
+            result["reads"] += 1
+            data = device.readfrom_mem(record.addr, record.memaddr, record.length, addrsize=record.addrsize)
+            if record.data is not None and data != record.data:
+                result["mismatches"].append({"index": index, "memaddr": record.memaddr, "length": record.length})
+        elif record.op == OP_WRITE:
+            result["writes"] += 1
+            device.writeto_mem(record.addr, record.memaddr, record.data, addrsize=record.addrsize)
+    result["device"] = device
+    return result
+
+
+def analyse(records, page_size: int = 64, block_size: int = 512, top: int = 10):
+    """
+    离线分析跟踪记录
+    :param records: TraceRecord序列
+    :param page_size: EEPROM页大小
+    :param block_size: LittleFS块大小
+    :param top: 热点块数量
+    :return: 统计结果，包括冗余读取、未对齐写入和热点块
+    """
+    stats = {
+        "reads": 0, "writes": 0, "errors": 0,
+        "bytes_read": 0, "bytes_written": 0,
+        "bus_time": 0.0,
+        "redundant_reads": 0, "redundant_bytes": 0,
+        "unaligned_writes": 0, "page_crossing_writes": 0,
+    }
+    known = bytearray()  # 每个字节是否已读取且之后未被写入
+    read_blocks = Counter()
+    write_blocks = Counter()
+
+    def mark(start, end, value):
+        if end > len(known):
+            known.extend(b"\x00" * (end - len(known)))
+        known[start:end] = bytes([value]) * (end - start)
+
+    for record in records:
+        if record.op == OP_SNAPSHOT:
+            continue
+        if record.error:
+            stats["errors"] += 1
+            continue
+        start, end = record.memaddr, record.memaddr + record.length
+        stats["bus_time"] += record.duration
+        for block in range(start // block_size, (end - 1) // block_size + 1):
+            (read_blocks if record.op == OP_READ else write_blocks)[block] += 1
+
+        if record.op == OP_READ:
+            stats["reads"] += 1
+            stats["bytes_read"] += record.length
+            if end <= len(known) and all(known[start:end]):
+                stats["redundant_reads"] += 1
+                stats["redundant_bytes"] += record.length
+            mark(start, end, 1)
+        elif record.op == OP_WRITE:
+            stats["writes"] += 1
+            stats["bytes_written"] += record.length
+            if start % page_size:
+                stats["unaligned_writes"] += 1
+            if start // page_size != (end - 1) // page_size:
+                stats["page_crossing_writes"] += 1
+            mark(start, end, 0)
+
+    stats["bus_time"] = round(stats["bus_time"], 6)
+    stats["hot_read_blocks"] = read_blocks.most_common(top)
+    stats["hot_write_blocks"] = write_blocks.most_common(top)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="I2C跟踪文件分析与回放")
+    parser.add_argument("command", choices=["analyse", "replay"])
+    parser.add_argument("trace", help="跟踪文件路径")
+    parser.add_argument("--image", help="回放时模拟设备的初始镜像，默认使用跟踪文件中的镜像")
+    parser.add_argument("--realtime", action="store_true", help="按记录的时间间隔回放")
+    args = parser.parse_args()
+
+    if args.command == "analyse":
+        print(json.dumps(analyse(read_trace(args.trace)), indent=2, ensure_ascii=False))
+    else:
+        device = None
+        if args.image:
+            with open(args.image, "rb") as fh:
+                image = fh.read()
+            device = SimulatedEEPROM(size=len(image), image=image)
+        result = replay(read_trace(args.trace), device, args.realtime)
+        result.pop("device")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
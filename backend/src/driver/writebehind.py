@@ -0,0 +1,233 @@
+import threading
+import time
+
+
+class CommitError(Exception):
+    """暂存的写入无法提交，已从暂存区丢弃"""
+
+
+class WriteBehind:
+    """
+    写回缓存
+    写入先进入内存暂存区并立即返回，后台线程在文件停止修改delay秒后提交到设备，
+    同一文件的连续写入合并为一次提交
+    """
+
+    def __init__(self, fs, delay: float = 0.5, lock=None):
+        """
+        :param fs: 文件系统实例，提交时调用其_commit_write/_commit_append
+        :param delay: 文件最后一次修改后等待提交的时间(秒)
+        :param lock: 提交时持有的锁，应与其他总线访问共用，默认新建
+        """
+        self.fs = fs
+        self.delay = delay
+        self.lock = lock or threading.RLock()
+        self.error = None  # 最近一次后台提交失败的原因
+        self._pending = {}  # 文件名 -> {"content", "appends", "base", "modified"}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="eeprom-write-behind", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _key(filename: str) -> str:
+        return filename.strip("/")
+
+    @property
+    def pending(self) -> int:
+        """暂存区中等待提交的文件数"""
+        return len(self._pending)
+
+    def write(self, filename: str, content: str) -> int:
+        """
+        暂存整个文件的内容，覆盖之前暂存的写入
+        :return: 文件大小
+        """
+        with self._cond:
+            self._pending[self._key(filename)] = {
+                "content": content, "appends": [], "base": 0, "modified": time.monotonic()
+            }
+            self._cond.notify()
+        return len(content.encode("utf-8"))
+
+    def append(self, filename: str, content: str, base_size) -> int:
+        """
+        暂存追加的内容
+        :param base_size: 返回设备上当前文件大小的函数，只在该文件没有暂存内容时调用
+        :return: 追加后的文件大小
+        """
+        key = self._key(filename)
+        # 持有提交锁，查询文件大小期间暂存区中的该文件不会被提交
+        with self.lock:
+            with self._cond:
+                staged = key in self._pending
+            base = 0 if staged else base_size()
+            return self._append(key, content, base)
+
+    def _append(self, key: str, content: str, base: int) -> int:
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = {"content": None, "appends": [], "base": base, "modified": 0}
+                self._pending[key] = entry
+            if entry["content"] is not None:
+                entry["content"] += content
+            else:
+                entry["appends"].append(content)
+            entry["modified"] = time.monotonic()
+            self._cond.notify()
+            return self._size(entry)
+
+    @staticmethod
+    def _size(entry) -> int:
+        if entry["content"] is not None:
+            return len(entry["content"].encode("utf-8"))
+        return entry["base"] + sum(len(s.encode("utf-8")) for s in entry["appends"])
+
+    def read(self, filename: str):
+        """
+        读取暂存的完整内容
+        :return: 暂存了整个文件时返回内容，否则返回None
+        """
+        with self._cond:
+            entry = self._pending.get(self._key(filename))
+            return entry["content"] if entry is not None else None
+
+    def staged(self, match=None) -> dict:
+        """
+        暂存区中的文件及其暂存写入后的大小，用于列目录时合并尚未提交的文件
+        :param match: 文件名过滤函数，默认返回全部
+        :return: {文件名: 大小}
+        """
+        with self._cond:
+            return {key: self._size(entry) for key, entry in self._pending.items() if match is None or match(key)}
+
+    def discard(self, match=None) -> int:
+        """
+        丢弃暂存的写入，用于格式化或恢复镜像
+        :param match: 文件名过滤函数，默认全部丢弃
+        :return: 丢弃的文件数
+        """
+        with self._cond:
+            keys = [key for key in self._pending if match is None or match(key)]
+            for key in keys:
+                del self._pending[key]
+            return len(keys)
+
+    def flush(self, match=None) -> int:
+        """
+        立即提交暂存的写入，返回时数据已写入设备
+        :param match: 文件名过滤函数，默认提交全部
+        :return: 提交的文件数
+        """
+        with self.lock:
+            with self._cond:
+                if not self._pending:
+                    return 0
+                keys = [key for key in self._pending if match is None or match(key)]
+                entries = [(key, self._pending.pop(key)) for key in keys]
+            self._commit(entries)
+            return len(entries)
+
+    def _commit(self, entries):
+        """
+        逐个提交。总线故障时把该文件及之后未提交的写入放回暂存区，等待重试；
+        其他错误(如空间不足)重试也不会成功，丢弃该文件的写入，其余文件提交完后报告
+        :raises CommitError: 有写入被丢弃
+        """
+        failed = []
+        for index, (key, entry) in enumerate(entries):
+            try:
+                if entry["content"] is not None:
+                    self.fs._commit_write(key, entry["content"])
+                else:
+                    self.fs._commit_append(key, "".join(entry["appends"]))
+            except Exception as e:
+                # 总线错误在LittleFS回调中发生时同样以LittleFSError抛出，按断路器记录的失败区分
+                if self.fs.breaker.failures:
+                    self.error = str(e)
+                    self._restore(entries[index:])
+                    raise
+                failed.append(f"{key}: {str(e)}")
+        if failed:
+            self.error = "以下文件的暂存写入提交失败，已丢弃: " + "; ".join(failed)
+            raise CommitError(self.error)
+        self.error = None
+
+    def _restore(self, entries):
+        with self._cond:
+            for key, entry in entries:
+                newer = self._pending.get(key)
+                if newer is None:
+                    self._pending[key] = entry
+                elif newer["content"] is None:
+                    # 之后只有追加，接在未提交的内容后面
+                    if entry["content"] is not None:
+                        newer["content"] = entry["content"] + "".join(newer["appends"])
+                        newer["appends"] = []
+                    else:
+                        newer["appends"] = entry["appends"] + newer["appends"]
+                        newer["base"] = entry["base"]
+
+    def _is_due(self, key: str) -> bool:
+        """文件停止修改的时间是否已超过delay"""
+        return time.monotonic() - self._pending[key]["modified"] >= self.delay
+
+    def _next_wait(self):
+        """距下一个文件到期的时间，已有文件到期时返回0，暂存区为空时返回None"""
+        if not self._pending:
+            return None
+        now = time.monotonic()
+        return max(min(self.delay - (now - entry["modified"]) for entry in self._pending.values()), 0.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    wait = self._next_wait()
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+                if self._closed:
+                    return
+            try:
+                # 提交时重新检查，等待锁期间可能已被flush提交或再次修改
+                self.flush(self._is_due)
+            except Exception as e:
+                print(f"后台提交写入失败: {str(e)}")
+                with self._cond:
+                    self._cond.wait(self.delay)
+
+    def detach(self) -> list:
+        """
+        停止后台提交并取出全部暂存的写入，不提交，用于把写入转交给新的实例
+        不等待后台线程退出：调用方可能持有提交锁，后台线程之后拿到锁时暂存区已为空
+        :return: [(文件名, 暂存的写入)]
+        """
+        with self.lock:
+            with self._cond:
+                self._closed = True
+                entries = list(self._pending.items())
+                self._pending.clear()
+                self._cond.notify()
+        return entries
+
+    def adopt(self, entries):
+        """
+        接收其他实例转交的暂存写入，保留原修改时间，到期后由后台线程提交
+        :param entries: detach返回的写入
+        """
+        self._restore(entries)
+        with self._cond:
+            self._cond.notify()
+
+    def close(self) -> int:
+        """
+        提交全部暂存的写入并停止后台线程
+        :return: 提交的文件数
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        return self.flush()
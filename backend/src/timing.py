@@ -0,0 +1,65 @@
+# 请求分阶段计时，只依赖标准库，驱动和接口层共用
+# 响应类、采样分析器和请求日志属于接口层，见api/timing.py
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# 请求耗时按阶段统计
+# lock: 等待会话锁  mount: 连接和挂载  lfs: LittleFS及接口逻辑
+# bus: 总线传输(含重试)  page_wait: 页写入等待  broker: 等待总线代理进程
+# serialize: JSON序列化  app: 其余框架开销
+PHASES = ("lock", "mount", "lfs", "bus", "page_wait", "broker", "serialize")
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """单个请求的分阶段耗时，嵌套阶段只计入最内层"""
+
+    def __init__(self):
+        self.phases = {}
+        self.threads = set()  # 执行过计时阶段的线程，供采样器使用
+        self._stack = []
+
+    def enter(self, name: str):
+        self.threads.add(threading.get_ident())
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        name, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed - children
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def header(self, total: float) -> str:
+        """生成Server-Timing响应头"""
+        items = [f"{name};dur={self.phases[name] * 1000:.2f}" for name in PHASES if name in self.phases]
+        items.append(f"app;dur={self.app_time(total) * 1000:.2f}")
+        items.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(items)
+
+    def app_time(self, total: float) -> float:
+        return max(total - sum(self.phases.values()), 0.0)
+
+
+def start_request() -> RequestTimings:
+    """开始统计当前请求"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+@contextmanager
+def phase(name: str):
+    """把代码块的耗时计入当前请求的指定阶段，不在请求中时不做任何事"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.enter(name)
+    try:
+        yield
+    finally:
+        timings.exit()
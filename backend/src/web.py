@@ -1,11 +1,26 @@
 import os
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from api import eeprom_router
-from fastapi import FastAPI
+import sys
+import time
+from contextlib import asynccontextmanager
+from assets import StaticAssets
+from api import eeprom_router, fs_session
+import timing
+from api.timing import SamplingProfiler, PROFILE_SLOW_MS, log_request
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 驱动导入和设备挂载放到后台，不阻塞服务启动
+    fs_session.start()
+    yield
+    # 退出前提交写回模式下暂存的写入
+    try:
+        fs_session.close()
+    except Exception as e:
+        print(f"提交暂存的写入失败: {str(e)}")
+
+app = FastAPI(lifespan=lifespan)
 
 # 添加 CORS 中间件
 app.add_middleware(
@@ -16,16 +31,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """统计接口请求各阶段耗时，通过Server-Timing响应头和日志输出"""
+    if not request.url.path.startswith("/eeprom"):
+        return await call_next(request)
+
+    timings = timing.start_request()
+    profiler = SamplingProfiler(timings).start() if PROFILE_SLOW_MS else None
+    start = time.perf_counter()
+    response = await call_next(request)
+    total = time.perf_counter() - start
+
+    # 开启采样时，只记录慢请求的调用栈
+    profile = None
+    if profiler is not None:
+        profiler.stop()
+        if total * 1000 >= PROFILE_SLOW_MS:
+            profile = profiler.report()
+
+    response.headers["Server-Timing"] = timings.header(total)
+    log_request(request.method, request.url.path, response.status_code, timings, total, profile)
+    return response
+
 app.include_router(eeprom_router, prefix="/eeprom")
 
-static_file_abspath = os.path.join(os.path.dirname(__file__), "..\static")
-app.mount("/static", StaticFiles(directory=static_file_abspath), name="static")
+# 打包后静态文件位于PyInstaller解压目录下
+if hasattr(sys, "_MEIPASS"):
+    static_file_abspath = os.path.join(sys._MEIPASS, "static")
+else:
+    static_file_abspath = os.path.join(os.path.dirname(__file__), "..", "static")
+
+# 前端构建产物在启动时加载到内存
+assets = StaticAssets(static_file_abspath)
+
+@app.get("/static/{path:path}")
+async def static(path: str, request: Request):
+    return assets.response(path, request)
 
 @app.get("/")
-def index():
-    return FileResponse(f"{static_file_abspath}/index.html")
+async def index(request: Request):
+    return assets.response("index.html", request)
 
-if __name__ == "__main__":
+def run(workers: int = 1, i2c=None, **kwargs):
+    """
+    启动服务
+    :param workers: 工作进程数，大于1时由总线代理进程持有I2C设备
+    :param i2c: 使用指定的I2C实例(如模拟设备)，默认打开CH347
+    :param kwargs: 传给uvicorn.run的其他参数
+    """
     import uvicorn
-    uvicorn.run(app)
+    if workers > 1:
+        # I2C设备只能由一个进程打开，多个工作进程通过总线代理进程访问
+        from api.broker import BrokerProcess
+        broker = BrokerProcess(i2c=i2c).start()
+        os.environ.update(broker.environ())
+        try:
+            uvicorn.run("web:app", workers=workers, **kwargs)
+        finally:
+            broker.stop()
+    else:
+        fs_session.i2c = i2c
+        uvicorn.run(app, **kwargs)
+
+if __name__ == "__main__":
+    run(int(os.environ.get("EEPROM_WORKERS", 1)))
 
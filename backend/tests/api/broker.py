@@ -0,0 +1,81 @@
+import pytest
+import sys
+import threading
+sys.path.append("../src")
+
+from driver import eeprom
+from driver.trace import SimulatedEEPROM
+from littlefs import LittleFSError
+from api.broker import BrokerServer, RemoteFilesystem
+from api.session import FilesystemSession
+
+@pytest.fixture
+def broker(monkeypatch, tmp_path):
+    """在线程中运行基于模拟EEPROM的总线代理"""
+    device = SimulatedEEPROM()
+    monkeypatch.setattr(eeprom, "I2C", lambda: device)
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    if sys.platform == "win32":
+        address = r"\\.\pipe\eeprom-broker-test"
+    else:
+        address = str(tmp_path / "broker.sock")
+    authkey = b"test"
+    server = BrokerServer(address, authkey)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = RemoteFilesystem(address, authkey)
+    client.format()
+    yield client, device, address, authkey, server
+    server.shutdown()
+    thread.join(5)
+
+def test_remote_calls(broker):
+    """测试通过代理调用文件系统，异常类型保持不变"""
+    client, _, _, _, _ = broker
+    assert client.i2c_connected
+    client.write_file("a.txt", "代理")
+    assert client.read_file("a.txt") == "代理"
+    assert [entry["path"] for entry in client.walk()] == ["a.txt"]
+    with pytest.raises(FileNotFoundError):
+        client.read_file("missing.txt")
+    with pytest.raises(LittleFSError):
+        client.stat("missing.txt")
+
+def test_remote_iterator(broker, monkeypatch):
+    """测试生成器逐段取回，提前结束时代理进程关闭生成器；namedtuple结果保持类型"""
+    from api import broker as broker_module
+    client, _, _, _, server = broker
+    monkeypatch.setattr(broker_module, "ITER_CHUNK", 4)
+    for i in range(10):
+        client.write_file(f"f{i}.txt", str(i))
+    assert [entry["name"] for entry in client.walk()] == [f"f{i}.txt" for i in range(10)]
+    assert not server._iterators
+
+    entries = client.walk()
+    assert next(entries)["name"] == "f0.txt"
+    assert len(server._iterators) == 1
+    entries.close()
+    assert not server._iterators
+
+    assert client.stat("f1.txt").size == 1
+
+def test_bulk_payload(broker):
+    """测试镜像通过共享内存传递"""
+    client, device, _, _, _ = broker
+    chunks = list(client.dump_image())
+    assert b"".join(chunks) == bytes(device.memory)
+    assert client.restore_image(b"".join(chunks)) == 0
+
+def test_session_and_shutdown(broker):
+    """测试多个会话共用代理，退出时提交暂存的写入"""
+    client, device, address, authkey, _ = broker
+    client.enable_write_behind(60)
+    sessions = [FilesystemSession(address, authkey) for _ in range(2)]
+    with sessions[0].use() as fs:
+        fs.write_file("b.txt", "共享")
+    with sessions[1].use() as fs:
+        assert fs.read_file("b.txt") == "共享"
+        assert fs.get_status()["pending_writes"] == 1
+
+    client.shutdown()
+    assert eeprom.I2CEEPROMFileSystem(i2c=device).read_file("b.txt") == "共享"
@@ -0,0 +1,146 @@
+import pytest
+import sys
+sys.path.append("../src")
+
+from api.session import Maintenance, HealthMonitor
+
+def test_maintenance_yields(sim_session):
+    """测试空闲维护在有请求时让出，空闲时完成全部步骤"""
+    maintenance = Maintenance(sim_session, idle=0)
+    sim_session._enter()  # 模拟正在等待会话锁的请求
+    maintenance._run_pass()
+    sim_session._leave()
+    assert maintenance.yielded == 1
+    assert maintenance.passes == 0
+
+    maintenance._run_pass()
+    assert maintenance.passes == 1
+    assert {"gc", "prewarm", "storage"} <= set(maintenance.steps)
+
+    # 维护后读取和统计都不再访问总线
+    device = sim_session.i2c
+    reads = device.reads
+    with sim_session.use() as fs:
+        fs.listdir("/")
+        fs.get_storage_info()
+    assert device.reads == reads
+
+def test_maintenance_control(sim_session):
+    """测试维护控制接口"""
+    assert sim_session.maintenance_control() == {"enabled": False}
+    with pytest.raises(ValueError):
+        sim_session.maintenance_control("pause")
+    sim_session.maintenance = Maintenance(sim_session)
+    assert sim_session.maintenance_control("pause")["paused"]
+    assert not sim_session.maintenance_control("resume")["paused"]
+    with pytest.raises(ValueError):
+        sim_session.maintenance_control("bogus")
+
+def test_health_monitor(sim_session):
+    """测试健康监测探测设备，设备重新出现时重新挂载，状态查询不访问总线"""
+    device = sim_session.i2c
+    with sim_session.use() as fs:
+        fs.write_file("a.txt", "健康")
+    monitor = HealthMonitor(sim_session)
+    sim_session.health = monitor
+    monitor.check()
+    assert monitor.present
+
+    device.eeprom_addr = 0x51  # 模拟设备断开
+    for _ in range(3):
+        monitor.check()
+    assert monitor.present is False
+    assert monitor.failures == 3
+    status = sim_session.status()
+    assert not status["bus_available"]
+    assert status["health"]["error_rate"] == 0.75
+
+    device.eeprom_addr = 0x50
+    monitor.check()
+    assert monitor.present and monitor.remounts == 1
+    reads = device.reads
+    status = sim_session.status()
+    assert device.reads == reads
+    assert status["bus_available"] and status["is_mounted"]
+    with sim_session.use() as fs:
+        assert fs.read_file("a.txt") == "健康"
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnraisableExceptionWarning")  # LittleFS回调中的总线错误
+def test_health_monitor_mounts_late_device(sim_session):
+    """测试启动时设备不在、挂载失败，首次探测到设备时挂载"""
+    device = sim_session.i2c
+    device.eeprom_addr = 0x51
+    with sim_session.use(check_bus=False) as fs:
+        assert not fs.remount()
+    device.eeprom_addr = 0x50
+    monitor = HealthMonitor(sim_session)
+    monitor.check()
+    assert monitor.present and monitor.remounts == 1
+    assert sim_session.status()["is_mounted"]
+
+def test_health_monitor_unformatted_backoff(monkeypatch):
+    """测试设备应答但未格式化时不在每次探测时重新挂载，挂载失败后按退避间隔重试"""
+    from driver import eeprom
+    from driver.trace import SimulatedEEPROM
+    from api.session import FilesystemSession
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    session = FilesystemSession(i2c=SimulatedEEPROM())
+    fs = session.mount()
+    assert fs.i2c_connected and not fs.is_mounted
+    remounts = []
+    remount = fs.remount
+    monkeypatch.setattr(fs, "remount", lambda: remounts.append(1) or remount())
+
+    monitor = HealthMonitor(session)
+    for _ in range(20):
+        monitor.check()
+    assert monitor.present and monitor.probes == 20
+    assert 1 <= len(remounts) <= 4
+    assert monitor.status()["mount_failures"] == len(remounts)
+    assert monitor.error == "设备应答但挂载失败"
+
+    # 格式化后恢复正常，不再重试
+    with session.use() as fs:
+        fs.format()
+    calls = len(remounts)
+    for _ in range(5):
+        monitor.check()
+    assert len(remounts) == calls
+    assert monitor.mount_failures == 0
+
+def test_reconnect_keeps_staged_writes(monkeypatch):
+    """测试适配器重新连接时旧实例暂存的写入转交给新实例，旧实例停止后台提交"""
+    from driver import eeprom
+    from driver.eeprom import I2CEEPROMFileSystem
+    from driver.trace import SimulatedEEPROM
+    from api import session as session_module
+    from api.session import FilesystemSession
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(session_module, "WRITE_BEHIND_MS", 60000)
+    device = SimulatedEEPROM()
+    I2CEEPROMFileSystem(i2c=device).format()
+    session = FilesystemSession(i2c=device)
+    old = session.mount()
+    old.write_file("a.txt", "断开前写入")
+    write_behind = old.write_behind
+    old.i2c_connected = False  # 模拟适配器断开
+
+    fs = session.mount()
+    assert fs is not old and old.write_behind is None
+    write_behind._thread.join(1)
+    assert not write_behind._thread.is_alive()
+    assert fs.get_status()["pending_writes"] == 1
+    assert fs.read_file("a.txt") == "断开前写入"
+    assert session.close() == 1
+    assert I2CEEPROMFileSystem(i2c=device).read_file("a.txt") == "断开前写入"
+
+def test_status_mounts_on_first_call(monkeypatch):
+    """测试首次查询状态时尚未挂载则先挂载，不报告设备未连接"""
+    from driver import eeprom
+    from driver.trace import SimulatedEEPROM
+    from api.session import FilesystemSession
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    session = FilesystemSession(i2c=SimulatedEEPROM())
+    status = session.status()
+    assert status["i2c_connected"]
+    assert session._fs is not None
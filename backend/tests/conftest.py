@@ -0,0 +1,25 @@
+import pytest
+import sys
+sys.path.append("../src")
+
+from driver import eeprom
+from driver.eeprom import I2CEEPROMFileSystem
+from driver.trace import SimulatedEEPROM
+from api.session import FilesystemSession
+
+@pytest.fixture
+def sim_fs(monkeypatch):
+    """基于模拟EEPROM的文件系统，模拟设备通过 sim_fs.i2c 访问"""
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    fs = I2CEEPROMFileSystem(i2c=SimulatedEEPROM())
+    fs.format()
+    return fs
+
+@pytest.fixture
+def sim_session(monkeypatch):
+    """基于模拟EEPROM的会话"""
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    session = FilesystemSession(i2c=SimulatedEEPROM())
+    with session.use() as fs:
+        fs.format()
+    return session
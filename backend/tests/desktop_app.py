@@ -0,0 +1,37 @@
+import json
+import pytest
+import sys
+import urllib.request
+sys.path.append("../src")
+
+import app
+from api import session as session_module
+from api.session import session
+from driver.eeprom import I2CEEPROMFileSystem
+from driver.trace import SimulatedEEPROM
+
+def test_stop_server_flushes(monkeypatch):
+    """测试窗口关闭后停止服务时执行lifespan关闭流程，暂存的写入提交到设备"""
+    # 提交延迟足够长，只有退出时的提交会写入设备
+    monkeypatch.setattr(session_module, "WRITE_BEHIND_MS", 60000)
+    monkeypatch.setattr(session_module, "MAINTENANCE_IDLE_MS", 0)
+    monkeypatch.setattr(session_module, "HEALTH_INTERVAL_MS", 0)
+    device = SimulatedEEPROM()
+    I2CEEPROMFileSystem(i2c=device).format()
+    monkeypatch.setattr(session, "i2c", device)
+    monkeypatch.setattr(session, "_fs", None)
+
+    sock = app.bind_socket()
+    host, port = sock.getsockname()
+    server, thread = app.start_server(sock)
+    app.wait_ready(server, thread)
+    request = urllib.request.Request(f"http://{host}:{port}/eeprom/write/a.txt", data=json.dumps({"content": "退出前写入"}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        assert response.status == 200
+    assert session._fs.get_status()["pending_writes"] == 1
+
+    app.stop_server(server, thread)
+    assert not thread.is_alive()
+    fs = I2CEEPROMFileSystem(i2c=device)
+    assert fs.read_file("a.txt") == "退出前写入"
@@ -143,3 +143,125 @@ def test_filesystem_error_handling(eeprom_fs):
         eeprom_fs.write_file("large.txt", large_content)
     print("写入超大文件测试通过")
     print_status(eeprom_fs, 3, "错误处理测试完成")
+
+def test_buffer_retry_and_breaker():
+    """测试传输重试与断路器(无需硬件)"""
+    from driver.eeprom import EEPROMBuffer, CircuitBreaker
+    from i2cpy import errors
+
+    class FlakyI2C:
+        """前failures次读取失败的I2C"""
+        def __init__(self, failures):
+            self.failures = failures
+            self.calls = 0
+
+        def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8):
+            self.calls += 1
+            if self.calls <= self.failures:
+                raise errors.I2COperationFailedError("readfrom_mem")
+            return b"\xff" * nbytes
+
+    # 偶发失败通过重试恢复
+    buffer = EEPROMBuffer(FlakyI2C(2))
+    buffer.retry_delay = 0
+    assert buffer[0:4] == b"\xff" * 4
+    assert buffer.breaker.failures == 0
+
+    # 连续失败后断路器断开，之后的传输直接失败
+    i2c = FlakyI2C(1000)
+    buffer = EEPROMBuffer(i2c, breaker=CircuitBreaker(threshold=2))
+    buffer.retry_delay = 0
+    for _ in range(2):
+        with pytest.raises(errors.I2CError):
+            buffer[0:4]
+    assert buffer.breaker.is_open
+    calls = i2c.calls
+    with pytest.raises(errors.I2CError):
+        buffer[0:4]
+    assert i2c.calls == calls
+
+def test_append_and_write_at(monkeypatch):
+    """测试追加与偏移写入只写入变化的部分(无需硬件)"""
+    from driver import eeprom
+    from driver.trace import SimulatedEEPROM
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    device = SimulatedEEPROM()
+    fs = I2CEEPROMFileSystem(i2c=device)
+    fs.format()
+
+    assert fs.append_file("log.txt", "a" * 4000) == 4000
+    writes = device.writes
+    assert fs.append_file("log.txt", "line\n") == 4005
+    append_writes = device.writes - writes
+
+    writes = device.writes
+    fs.write_file("log.txt", "a" * 4000 + "line\n")
+    assert device.writes - writes > append_writes * 4
+
+    assert fs.write_at("log.txt", 4000, "LINE") == 4005
+    assert fs.read_file("log.txt").endswith("LINE\n")
+    assert fs.write_at("new.txt", 2, "x") == 3
+    assert fs.read_file("new.txt") == "\x00\x00x"
+    with pytest.raises(ValueError):
+        fs.write_at("new.txt", -1, "x")
+
+def test_write_behind(monkeypatch):
+    """测试写回模式合并连续写入，flush后数据写入设备(无需硬件)"""
+    from driver import eeprom
+    from driver.trace import SimulatedEEPROM
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    device = SimulatedEEPROM()
+    fs = I2CEEPROMFileSystem(i2c=device)
+    fs.format()
+    fs.enable_write_behind(delay=60)
+
+    writes = device.writes
+    for i in range(5):
+        fs.write_file("a.txt", f"版本{i}")
+    assert fs.append_file("log.txt", "1\n") == 2
+    assert fs.append_file("log.txt", "2\n") == 4
+    assert device.writes == writes
+    assert fs.read_file("a.txt") == "版本4"
+    assert fs.get_status()["pending_writes"] == 2
+
+    # 列目录时合并暂存的文件，不提交
+    fs.mkdir("logs")
+    fs.append_file("logs/b.txt", "追加")
+    writes = device.writes
+    files = {st.name: st.size for st in fs.scandir("/") if st.type == 1}
+    assert files == {"a.txt": len("版本4".encode("utf-8")), "log.txt": 4}
+    assert sorted(fs.listdir("/")) == ["a.txt", "log.txt", "logs"]
+    assert [(st.name, st.size) for st in fs.scandir("logs")] == [("b.txt", 6)]
+    assert device.writes == writes
+    assert fs.get_status()["pending_writes"] == 3
+    assert fs.flush() == 3
+
+    fs.write_file("a.txt", "最终")
+    assert fs.close_write_behind() == 1
+    assert I2CEEPROMFileSystem(i2c=device).read_file("a.txt") == "最终"
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnraisableExceptionWarning")  # LittleFS回调中的总线错误
+def test_write_behind_failures(sim_fs):
+    """测试写回模式下父目录在暂存时检查，无法提交的写入被丢弃并报告，总线故障时保留重试"""
+    from driver.writebehind import CommitError
+    device = sim_fs.i2c
+    sim_fs.enable_write_behind(delay=60)
+    with pytest.raises(FileNotFoundError):
+        sim_fs.write_file("nodir/a.txt", "x")
+
+    sim_fs.write_file("huge.bin", "x" * sim_fs.size)
+    sim_fs.write_file("ok.txt", "正常")
+    with pytest.raises(CommitError, match="huge.bin"):
+        sim_fs.flush()
+    assert sim_fs.get_status()["pending_writes"] == 0
+    assert sim_fs.read_file("ok.txt") == "正常"
+
+    sim_fs.write_file("ok.txt", "重试")
+    device.nack_rate = 1.0
+    with pytest.raises(Exception):
+        sim_fs.flush()
+    assert sim_fs.get_status()["pending_writes"] == 1
+    device.nack_rate = 0.0
+    sim_fs.breaker.reset()
+    assert sim_fs.flush() == 1
+    assert I2CEEPROMFileSystem(i2c=device).read_file("ok.txt") == "重试"
@@ -0,0 +1,52 @@
+import pytest
+import sys
+sys.path.append("../src")
+
+from driver.image import ImageEEPROMFileSystem, ImageBuffer
+from littlefs import LittleFS, UserContext
+
+@pytest.fixture
+def image_path(tmp_path):
+    """创建包含测试文件的LittleFS镜像"""
+    context = UserContext(buffsize=512 * 64)
+    fs = LittleFS(context=context, block_size=512, block_count=64)
+    with fs.open("test.txt", "w") as fh:
+        fh.write("镜像文件内容")
+    path = tmp_path / "eeprom.bin"
+    path.write_bytes(context.buffer)
+    return str(path)
+
+def test_image_read_only(image_path):
+    """测试只读打开镜像"""
+    fs = ImageEEPROMFileSystem(image_path)
+    status = fs.get_status()
+    assert status["i2c_connected"] is True
+    assert status["is_mounted"] is True
+    assert fs.block_count == 64
+    assert fs.listdir() == ["test.txt"]
+    assert fs.read_file("test.txt") == "镜像文件内容"
+
+    # 只读镜像拒绝写入
+    with pytest.raises(PermissionError):
+        fs.write_file("new.txt", "x")
+    with pytest.raises(PermissionError):
+        fs.remove("test.txt")
+
+def test_image_zero_copy_dump(image_path):
+    """测试镜像导出直接返回映射区域"""
+    fs = ImageEEPROMFileSystem(image_path)
+    chunks = list(fs.dump_image())
+    assert all(isinstance(chunk, memoryview) for chunk in chunks)
+    with open(image_path, "rb") as fh:
+        assert b"".join(chunks) == fh.read()
+    del chunks
+
+def test_image_writable(image_path):
+    """测试可写镜像的修改会写回文件"""
+    image = ImageBuffer(image_path, writable=True)
+    fs = ImageEEPROMFileSystem(image)
+    fs.write_file("new.txt", "新内容")
+    image.close()
+
+    fs = ImageEEPROMFileSystem(image_path)
+    assert fs.read_file("new.txt") == "新内容"
@@ -0,0 +1,53 @@
+import pytest
+import sys
+sys.path.append("../src")
+
+from driver.kvstore import KVStore
+
+def test_put_get_delete(sim_fs):
+    """测试写入、删除和遍历，重新挂载后从日志重建索引"""
+    sim_fs.kv_put("net/ip", "192.168.1.10")
+    sim_fs.kv_put_many({"net/mask": "255.255.255.0", "name": "设备1"})
+    sim_fs.kv_put("net/ip", "10.0.0.2")
+    sim_fs.kv_delete("name")
+    with pytest.raises(KeyError):
+        sim_fs.kv_delete("name")
+    with pytest.raises(ValueError):
+        sim_fs.kv_put("", "empty")
+
+    reads = sim_fs.i2c.reads
+    assert sim_fs.kv_get("net/ip") == "10.0.0.2"
+    assert sim_fs.i2c.reads == reads
+    assert sim_fs.kv_scan("net/") == [("net/ip", "10.0.0.2"), ("net/mask", "255.255.255.0")]
+    assert sim_fs.kv_scan(after="net/ip", limit=1) == [("net/mask", "255.255.255.0")]
+
+    sim_fs.remount()
+    assert sim_fs.kv_scan() == [("net/ip", "10.0.0.2"), ("net/mask", "255.255.255.0")]
+
+def test_external_change(sim_fs):
+    """测试日志文件被其他实例修改或删除后，读取时重新加载"""
+    sim_fs.kv_put("a", "1")
+    other = KVStore(sim_fs)
+    other.put("a", "2")
+    assert sim_fs.kv_get("a") == "2"
+    sim_fs.remove(other.path)
+    with pytest.raises(KeyError):
+        sim_fs.kv_get("a")
+    assert sim_fs.kv_scan() == []
+
+def test_compact(sim_fs):
+    """测试压缩只保留当前值，日志末尾的无效记录在下次写入前去掉"""
+    store = KVStore(sim_fs, compact_min=0)
+    for i in range(20):
+        store.put("counter", str(i))
+    assert store.needs_compaction()
+    assert store.compact() > 0
+    assert KVStore(sim_fs).scan() == [("counter", "19")]
+
+    with sim_fs.open(store.path, "ab") as fh:
+        fh.write(b"\x01\x07")  # 写入中断留下的不完整记录
+    store = KVStore(sim_fs)
+    assert store.get("counter") == "19"
+    assert store.needs_compaction()
+    store.put("other", "x")
+    assert KVStore(sim_fs).scan() == [("counter", "19"), ("other", "x")]
@@ -0,0 +1,76 @@
+import pytest
+import sys
+sys.path.append("../src")
+
+from driver.metadata import locate, read_dir, TYPE_INLINESTRUCT, TYPE_CTZSTRUCT
+
+def test_read_dir(sim_fs):
+    """测试解析目录项，小文件内联存储，大文件使用CTZ链表"""
+    sim_fs.mkdir("logs")
+    sim_fs.write_file("small.txt", "abc")
+    sim_fs.write_file("logs/big.txt", "x" * 2000)
+    sim_fs.remove("small.txt")
+    sim_fs.write_file("small.txt", "abcd")
+
+    root = {entry["name"]: entry for entry in read_dir(sim_fs._read_block)}
+    assert set(root) == {"logs", "small.txt"}
+    assert root["small.txt"]["struct"] == TYPE_INLINESTRUCT
+    assert root["small.txt"]["struct_data"] == b"abcd"
+
+    locations = locate(sim_fs._read_block, ["logs/big.txt", "small.txt", "missing.txt"])
+    assert set(locations) == {"logs/big.txt", "small.txt"}
+    assert locations["logs/big.txt"][0] >= 2  # 数据块在超级块对之后
+
+def test_device_order(sim_fs):
+    """测试按设备位置排序，不存在的文件排在最后"""
+    for i in range(4):
+        sim_fs.write_file(f"f{i}.txt", str(i) * 1000)
+    sim_fs.write_file("inline.txt", "内联")
+    order = sim_fs.device_order(["missing.txt", "f3.txt", "f1.txt", "inline.txt", "f0.txt", "f2.txt"])
+    assert order[0] == "inline.txt"
+    assert order[-1] == "missing.txt"
+    heads = locate(sim_fs._read_block, order[1:-1])
+    assert [heads[p] for p in order[1:-1]] == sorted(heads.values())
+
+def test_locate_first_block(sim_fs):
+    """测试CTZ文件定位到第一个数据块而不是链表头"""
+    data = bytes(i % 251 for i in range(12000))
+    with sim_fs.open("big.bin", "wb") as fh:
+        fh.write(data)
+    entry = next(e for e in read_dir(sim_fs._read_block) if e["name"] == "big.bin")
+    assert entry["struct"] == TYPE_CTZSTRUCT
+    head = int.from_bytes(entry["struct_data"][:4], "little")
+    block, offset = locate(sim_fs._read_block, ["big.bin"])["big.bin"]
+    assert block != head
+    assert bytes(sim_fs._read_block(block)[:64]) == data[:64]
+
+def test_raw_view(sim_fs):
+    """测试原始数据视图：未缓存的页顺序读取，之后直接使用缓存，写入同步更新缓存"""
+    device = sim_fs.i2c
+    reads = device.reads
+    view = sim_fs.raw_view(0, sim_fs.size)
+    assert isinstance(view, memoryview)
+    loaded = device.reads - reads
+    assert sim_fs.raw_view(0, sim_fs.size) == view
+    assert device.reads - reads == loaded
+
+    sim_fs.write_file("big.txt", "y" * 2000)
+    image = b"".join(sim_fs.context.buffer.read_sequential(0, sim_fs.size))
+    assert view == image  # 之前的视图已反映写入
+    with pytest.raises(ValueError):
+        sim_fs.raw_view(sim_fs.size - 4, 8)
+
+def test_inspect_block(sim_fs):
+    """测试解析块中的元数据标签"""
+    sim_fs.write_file("big.txt", "z" * 2000)
+    blocks = [sim_fs.inspect_block(block) for block in (0, 1)]
+    info = max(blocks, key=lambda b: b["revision"])
+    assert info["metadata"]
+    names = [tag["value"] for tag in info["tags"] if tag["name"] == "reg"]
+    assert names == ["big.txt"]
+    ctz = [tag for tag in info["tags"] if tag["type"] == TYPE_CTZSTRUCT][-1]
+    head = int(ctz["value"].split()[1])
+    assert ctz["value"].endswith("size 2000")
+    assert not sim_fs.inspect_block(head)["metadata"]
+    with pytest.raises(ValueError):
+        sim_fs.inspect_block(64)
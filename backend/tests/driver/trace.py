@@ -0,0 +1,39 @@
+import pytest
+import sys
+sys.path.append("../src")
+
+from driver.trace import SimulatedEEPROM, read_trace, replay, analyse
+
+def test_simulated_page_wrap():
+    """测试模拟设备的页内回绕"""
+    device = SimulatedEEPROM(size=256, page_size=16)
+    device.writeto_mem(0x50, 14, b"abcd")
+    assert device.memory[14:16] == b"ab"
+    assert device.memory[0:2] == b"cd"
+
+def test_record_and_replay(sim_fs, tmp_path):
+    """测试记录总线传输并在模拟设备上回放"""
+    fs, device = sim_fs, sim_fs.i2c
+    path = str(tmp_path / "session.trace")
+    fs.start_trace(path)
+    fs.write_file("test.txt", "跟踪测试内容")
+    assert fs.read_file("test.txt") == "跟踪测试内容"
+    info = fs.stop_trace()
+    assert info["transactions"] > 0
+
+    records = list(read_trace(path))
+    result = replay(records)
+    assert result["mismatches"] == []
+    assert result["device"].memory == device.memory
+
+    stats = analyse(records)
+    assert stats["writes"] > 0
+    assert stats["page_crossing_writes"] == 0
+    assert stats["hot_write_blocks"]
+
+def test_simulated_nack():
+    """测试模拟设备的随机无应答"""
+    from i2cpy import errors
+    device = SimulatedEEPROM(nack_rate=1.0)
+    with pytest.raises(errors.I2CError):
+        device.readfrom_mem(0x50, 0, 4)
@@ -0,0 +1,64 @@
+import pytest
+import subprocess
+import sys
+import time
+sys.path.append("../src")
+
+import timing
+from fastapi.testclient import TestClient
+
+@pytest.fixture
+def client(monkeypatch):
+    """web.py的应用，会话使用模拟EEPROM"""
+    from driver import eeprom
+    from driver.trace import SimulatedEEPROM
+    from api.session import session
+    import web
+    monkeypatch.setattr(eeprom.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(session, "i2c", SimulatedEEPROM())
+    monkeypatch.setattr(session, "_fs", None)
+    with session.use() as fs:
+        fs.format()
+    return TestClient(web.app)
+
+def parse(header: str) -> dict:
+    """解析Server-Timing响应头为 {阶段: 毫秒}"""
+    result = {}
+    for item in header.split(","):
+        name, _, duration = item.strip().partition(";dur=")
+        result[name] = float(duration)
+    return result
+
+def test_server_timing_header(client):
+    """测试接口请求带Server-Timing响应头，其他路径不带"""
+    response = client.post("/eeprom/write/a.txt", json={"content": "计时"})
+    assert response.status_code == 200
+    phases = parse(response.headers["Server-Timing"])
+    assert {"lock", "lfs", "bus", "serialize", "app", "total"} <= set(phases)
+    assert sum(v for k, v in phases.items() if k != "total") == pytest.approx(phases["total"], abs=0.05)
+
+    response = client.get("/eeprom/read/missing.txt")
+    assert response.status_code == 404
+    assert "total" in parse(response.headers["Server-Timing"])
+
+    response = client.get("/static/missing.js")
+    assert response.status_code == 404
+    assert "Server-Timing" not in response.headers
+
+def test_nested_phases():
+    """测试嵌套阶段只计入最内层，不在请求中时不计时"""
+    with timing.phase("lfs"):
+        pass
+    timings = timing.start_request()
+    with timing.phase("lfs"):
+        with timing.phase("bus"):
+            time.sleep(0.02)
+    assert timings.phases["bus"] >= 0.02
+    assert timings.phases["lfs"] < 0.02
+    assert timings.app_time(timings.phases["bus"] + timings.phases["lfs"]) == 0.0
+
+def test_driver_without_web_stack():
+    """测试驱动包只依赖标准库的计时模块，导入时不加载fastapi"""
+    code = "import sys, driver; print(sorted(m for m in sys.modules if m.split('.')[0] in ('fastapi', 'starlette', 'pydantic')))"
+    result = subprocess.run([sys.executable, "-c", code], cwd="../src", capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,83 @@
+import pytest
+import sys
+import gzip
+sys.path.append("../src")
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from assets import StaticAssets, precompress, accepted_encodings, IMMUTABLE, REVALIDATE
+
+SCRIPT = b"console.log('eeprom');\n" * 100
+
+@pytest.fixture
+def client(tmp_path):
+    """基于临时静态目录的应用，包含带哈希的脚本和不带哈希的首页，静态目录之外有一个文件"""
+    static = tmp_path / "static"
+    (static / "assets").mkdir(parents=True)
+    (static / "assets" / "index-3f2a9c1d.js").write_bytes(SCRIPT)
+    (static / "index.html").write_bytes(b"<html></html>")
+    (tmp_path / "secret.txt").write_bytes(b"secret")
+    precompress(str(static))
+    assets = StaticAssets(str(static))
+    app = FastAPI()
+
+    @app.get("/static/{path:path}")
+    async def static(path: str, request: Request):
+        return assets.response(path, request)
+
+    return TestClient(app)
+
+def get(client, path, **headers):
+    """
+    发送GET请求，测试客户端默认发送Accept-Encoding并自动解压，这里显式指定并读取未解码的响应体
+    :return: (响应, 响应体)
+    """
+    headers.setdefault("Accept-Encoding", "identity")
+    with client.stream("GET", path, headers=headers) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_encoding_negotiation(client):
+    """测试按Accept-Encoding选择br、gzip或原始内容"""
+    import brotli
+    path = "/static/assets/index-3f2a9c1d.js"
+    response, body = get(client, path, **{"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(body) == SCRIPT
+
+    response, body = get(client, path, **{"Accept-Encoding": "gzip, br;q=0"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body) == SCRIPT
+
+    response, body = get(client, path)
+    assert "Content-Encoding" not in response.headers
+    assert body == SCRIPT
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["Content-Type"] == "text/javascript; charset=utf-8"
+
+def test_etag_not_modified(client):
+    """测试ETag按编码区分，匹配时返回304"""
+    path = "/static/assets/index-3f2a9c1d.js"
+    plain = get(client, path)[0].headers["ETag"]
+    encoded = get(client, path, **{"Accept-Encoding": "gzip"})[0].headers["ETag"]
+    assert plain != encoded
+
+    response, body = get(client, path, **{"If-None-Match": plain})
+    assert response.status_code == 304
+    assert body == b""
+    response, _ = get(client, path, **{"Accept-Encoding": "gzip", "If-None-Match": plain})
+    assert response.status_code == 200
+
+def test_cache_control(client):
+    """测试带哈希的文件长期缓存，其余文件每次重新验证，不存在的文件返回404"""
+    response, _ = get(client, "/static/assets/index-3f2a9c1d.js")
+    assert response.headers["Cache-Control"] == IMMUTABLE
+    response, _ = get(client, "/static/index.html", **{"Accept-Encoding": "gzip"})
+    assert response.headers["Cache-Control"] == REVALIDATE
+    assert "Content-Encoding" not in response.headers  # 小文件不压缩
+    assert get(client, "/static/missing.js")[0].status_code == 404
+    assert get(client, "/static/%2E%2E/secret.txt")[0].status_code == 404
+
+def test_accepted_encodings():
+    """测试解析Accept-Encoding，忽略q=0"""
+    assert accepted_encodings("gzip, deflate, br;q=0.0") == {"gzip", "deflate"}
+    assert accepted_encodings("") == set()